@@ -25,17 +25,50 @@ __license__ = "GNU General Public License Version 3"
 __version__ = "1.0.1"
 
 
-from idlealign import utils
-from idlealign.extension import idlealign as idlealign
+from typing import TYPE_CHECKING
+
+from idlealign import config
+
+if TYPE_CHECKING:
+    from idlealign.extension import idlealign as idlealign
+
+
+def get_required_config() -> str:
+    """Return configuration text the extension needs."""
+    from idlealign import utils
+    from idlealign.extension import idlealign
+
+    return utils.get_required_config(
+        idlealign.values,
+        idlealign.bind_defaults,
+        __title__,
+    )
 
 
 def check_installed() -> bool:
-    """Make sure extension installed."""
-    return utils.check_installed(__title__, __version__, idlealign)
+    """Make sure extension installed.
+
+    Only reads configuration files, idlelib and tkinter are not
+    imported unless the extension is missing.
+    """
+    return config.check_installed(
+        __title__,
+        __version__,
+        get_required_config,
+    )
+
 
+def __getattr__(name: str) -> object:
+    """Import extension class the first time IDLE asks for it."""
+    if name != "idlealign":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from idlealign import utils
+    from idlealign.extension import idlealign
 
-utils.set_title(__title__)
-idlealign.reload()
+    utils.set_title(__title__)
+    idlealign.reload()
+    globals()["idlealign"] = idlealign
+    return idlealign
 
 
 if __name__ == "__main__":
@@ -0,0 +1,597 @@
+"""CLI - Align files from the command line."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "cli"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Final, NamedTuple
+
+from idlealign import config, engine, gitdiff, lineindex
+from idlealign.profiling import Profile
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+    from re import Pattern
+
+# Bump when alignment output changes so old cache entries are ignored
+CACHE_VERSION: Final = 1
+DEFAULT_CACHE_PATH: Final = ".idlealign-cache.json"
+# Below this many files to process, a process pool costs more than it saves
+MIN_POOL_FILES: Final = 16
+# Files at least this big are aligned through a memory mapped line index
+# instead of being read into memory as a whole
+MAPPED_MIN_BYTES: Final = 64 * 1024 * 1024
+# Bytes hashed at a time by get_file_digest
+DIGEST_CHUNK_SIZE: Final = 1024 * 1024
+
+
+class AlignOptions(NamedTuple):
+    """Options for aligning whole files."""
+
+    pattern: Pattern[str]
+    space_wrap: bool = True
+    align_side: bool = False
+
+    def cache_key(self) -> bytes:
+        """Return bytes uniquely identifying these options."""
+        return (
+            f"{CACHE_VERSION}\0{self.pattern.pattern}\0{self.pattern.flags}"
+            f"\0{self.space_wrap}\0{self.align_side}\0"
+        ).encode()
+
+
+class FileResult(NamedTuple):
+    """Result of aligning one file."""
+
+    path: str
+    changed: bool
+    digest: str | None = None
+    error: str | None = None
+
+
+def get_digest(content: bytes, options: AlignOptions) -> str:
+    """Return content hash of file content with alignment options."""
+    hasher = hashlib.blake2b(options.cache_key(), digest_size=16)
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def get_file_digest(path: str, options: AlignOptions) -> str:
+    """Return content hash of file at path, see get_digest.
+
+    File is hashed a chunk at a time, so it does not have to fit in
+    memory.
+    """
+    hasher = hashlib.blake2b(options.cache_key(), digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(DIGEST_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def align_mapped_file(
+    path: str,
+    options: AlignOptions,
+    write: bool = False,
+    line_ranges: Sequence[tuple[int, int]] | None = None,
+) -> FileResult:
+    """Align huge file at path without reading it into memory.
+
+    See align_file.
+    """
+    try:
+        changed = lineindex.align_file(
+            path,
+            options.pattern,
+            options.space_wrap,
+            options.align_side,
+            write,
+            line_ranges,
+        )
+        if line_ranges is not None or (changed and not write):
+            return FileResult(path, changed)
+        return FileResult(path, changed, get_file_digest(path, options))
+    except (OSError, UnicodeDecodeError) as exc:
+        return FileResult(path, False, error=str(exc))
+
+
+class ContentCache:
+    """On-disk map of file paths to content hashes known to be aligned."""
+
+    __slots__ = ("aligned", "dirty", "path")
+
+    def __init__(self, path: Path | None) -> None:
+        """Load cache from path. If path is None, cache is not saved."""
+        self.path = path
+        self.aligned: dict[str, str] = {}
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            aligned = data.get("aligned", {})
+            if isinstance(aligned, dict):
+                self.aligned = aligned
+
+    def is_aligned(self, path: str, digest: str) -> bool:
+        """Return if file at path with content digest is known aligned."""
+        return self.aligned.get(path) == digest
+
+    def add(self, path: str, digest: str) -> None:
+        """Remember that file at path with content digest is aligned."""
+        if self.aligned.get(path) != digest:
+            self.aligned[path] = digest
+            self.dirty = True
+
+    def save(self) -> None:
+        """Write cache to disk if it changed."""
+        if self.path is None or not self.dirty:
+            return
+        self.path.write_text(
+            json.dumps({"version": CACHE_VERSION, "aligned": self.aligned}),
+            encoding="utf-8",
+        )
+        self.dirty = False
+
+
+def expand_paths(
+    paths: Iterable[str],
+    include: str = "*.py",
+) -> list[str]:
+    """Return sorted unique files from paths, globs and directories.
+
+    Directories are searched recursively for files matching include.
+    """
+    files: dict[str, None] = {}
+    for path in paths:
+        matches = (
+            glob.glob(path, recursive=True) if glob.has_magic(path) else [path]
+        )
+        for match in matches:
+            match_path = Path(match)
+            if match_path.is_dir():
+                for file in match_path.rglob(include):
+                    if file.is_file():
+                        files[str(file)] = None
+            elif match_path.is_file():
+                files[str(match_path)] = None
+    return sorted(files)
+
+
+def align_file(
+    path: str,
+    options: AlignOptions,
+    write: bool = False,
+    line_ranges: Sequence[tuple[int, int]] | None = None,
+) -> FileResult:
+    """Align file at path, writing it back if write is set.
+
+    If line_ranges are given, only blocks touching those inclusive
+    (first, last) zero-based line indexes are aligned.
+
+    Returned digest is of the aligned content, so it can be cached. It
+    is None if only part of the file was looked at.
+
+    Files of at least MAPPED_MIN_BYTES are handled by align_mapped_file.
+    """
+    try:
+        if os.path.getsize(path) >= MAPPED_MIN_BYTES:
+            return align_mapped_file(path, options, write, line_ranges)
+        content = Path(path).read_bytes()
+        text = content.decode("utf-8")
+    except (OSError, UnicodeDecodeError) as exc:
+        return FileResult(path, False, error=str(exc))
+
+    if not write:
+        # Only need to know if anything would change
+        if not engine.is_text_aligned(
+            text,
+            options.pattern,
+            options.space_wrap,
+            options.align_side,
+            line_ranges,
+        ):
+            return FileResult(path, True)
+        if line_ranges is not None:
+            return FileResult(path, False)
+        return FileResult(path, False, get_digest(content, options))
+
+    new_text = engine.align_text(
+        text,
+        options.pattern,
+        options.space_wrap,
+        options.align_side,
+        line_ranges,
+    )
+    if new_text is None:
+        if line_ranges is not None:
+            return FileResult(path, False)
+        return FileResult(path, False, get_digest(content, options))
+
+    new_content = new_text.encode("utf-8")
+    try:
+        Path(path).write_bytes(new_content)
+    except OSError as exc:
+        return FileResult(path, True, error=str(exc))
+    if line_ranges is not None:
+        return FileResult(path, True)
+    return FileResult(path, True, get_digest(new_content, options))
+
+
+def align_files(
+    paths: Sequence[str],
+    options: AlignOptions,
+    write: bool = False,
+    cache: ContentCache | None = None,
+    jobs: int | None = None,
+    changed_lines: dict[str, list[tuple[int, int]]] | None = None,
+) -> list[FileResult]:
+    """Align files, skipping any whose content hash is in cache.
+
+    If changed_lines is given, it maps paths to inclusive zero-based
+    line index ranges, and only blocks touching those lines are
+    aligned. Paths not in changed_lines are skipped.
+
+    Files are spread over a process pool when there are enough of them.
+    Returns results for files that were not skipped.
+    """
+    pending: list[str] = []
+    for path in paths:
+        if changed_lines is not None and path not in changed_lines:
+            continue
+        if cache is not None:
+            try:
+                digest = get_file_digest(path, options)
+            except OSError:
+                digest = None
+            if digest is not None and cache.is_aligned(path, digest):
+                continue
+        pending.append(path)
+
+    ranges = [
+        None if changed_lines is None else changed_lines[path]
+        for path in pending
+    ]
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1 or len(pending) < MIN_POOL_FILES:
+        results = list(
+            map(
+                align_file,
+                pending,
+                [options] * len(pending),
+                [write] * len(pending),
+                ranges,
+            ),
+        )
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(
+                executor.map(
+                    align_file,
+                    pending,
+                    [options] * len(pending),
+                    [write] * len(pending),
+                    ranges,
+                    chunksize=max(1, len(pending) // (jobs * 4)),
+                ),
+            )
+
+    if cache is not None:
+        for result in results:
+            if result.digest is not None:
+                cache.add(result.path, result.digest)
+    return results
+
+
+def get_options(args: argparse.Namespace) -> AlignOptions:
+    """Return alignment options from parsed arguments."""
+    if args.preset is not None:
+        preset = engine.get_default_preset(args.preset)
+        return AlignOptions(
+            preset.pattern,
+            preset.space_wrap,
+            preset.align_side,
+        )
+    return AlignOptions(
+        engine.compile_pattern(
+            args.pattern,
+            "literal" if args.literal else "regex",
+        ),
+        not args.no_space_wrap,
+        args.right,
+    )
+
+
+def get_changed_lines(
+    paths: Sequence[str],
+    rev: str,
+) -> dict[str, list[tuple[int, int]]]:
+    """Return zero-based changed line ranges for paths compared to rev."""
+    changed = {
+        os.path.normpath(path): [
+            (first - 1, last - 1) for first, last in ranges
+        ]
+        for path, ranges in gitdiff.get_changed_lines(paths, rev).items()
+    }
+    return {
+        path: changed[os.path.normpath(path)]
+        for path in paths
+        if os.path.normpath(path) in changed
+    }
+
+
+def run_align(args: argparse.Namespace) -> int:
+    """Run align command. Return exit code."""
+    options = get_options(args)
+    cache = None
+    if not args.no_cache:
+        cache = ContentCache(Path(args.cache))
+
+    paths = expand_paths(args.paths, args.include)
+    changed_lines = None
+    if args.diff is not None:
+        try:
+            changed_lines = get_changed_lines(paths, args.diff)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            print(f"error: git diff failed: {exc}", file=sys.stderr)
+            return 1
+
+    results = align_files(
+        paths,
+        options,
+        write=args.write,
+        cache=cache,
+        jobs=args.jobs,
+        changed_lines=changed_lines,
+    )
+
+    failed = False
+    for result in results:
+        if result.error is not None:
+            print(f"error: {result.path}: {result.error}", file=sys.stderr)
+            failed = True
+        elif result.changed:
+            if args.write:
+                print(f"aligned {result.path}")
+            else:
+                print(f"would align {result.path}")
+                failed = True
+
+    if cache is not None:
+        cache.save()
+    return 1 if failed else 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """Run serve command. Return exit code."""
+    from idlealign.server import AlignServer
+
+    AlignServer().serve(sys.stdin, sys.stdout, args.jobs)
+    return 0
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    """Run watch command. Return exit code."""
+    from idlealign.watch import Watcher
+
+    options = get_options(args)
+    watcher = Watcher(
+        args.paths,
+        options.pattern,
+        options.space_wrap,
+        options.align_side,
+        include=args.include,
+        debounce=args.debounce,
+        on_aligned=lambda path: print(f"aligned {path}", flush=True),
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        watcher.run(args.interval, workers=args.jobs)
+    return 0
+
+
+def add_pattern_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add alignment pattern and option arguments to parser."""
+    pattern = parser.add_mutually_exclusive_group(required=True)
+    pattern.add_argument("-p", "--pattern", help="pattern to align on")
+    pattern.add_argument(
+        "--preset",
+        choices=tuple(engine.DEFAULT_PRESETS),
+        help="default preset to align with",
+    )
+    parser.add_argument(
+        "--literal",
+        action="store_true",
+        help="treat pattern as literal text instead of a regular expression",
+    )
+    parser.add_argument(
+        "--no-space-wrap",
+        action="store_true",
+        help="do not wrap matched text with spaces",
+    )
+    parser.add_argument(
+        "--right",
+        action="store_true",
+        help="align on the right side of matched text",
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Return command line argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="idlealign",
+        description="Emacs Align by Regular Expression for IDLE. "
+        "Without a command, check that the extension is installed.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write cProfile statistics and a tracemalloc snapshot of the "
+        "command to the IDLE logs folder (only the main thread is profiled, "
+        "use --jobs 1 to include all alignment work)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    align = subparsers.add_parser(
+        "align",
+        help="align blocks of matching lines in files",
+    )
+    align.add_argument(
+        "paths",
+        nargs="+",
+        help="files, directories or glob patterns to align",
+    )
+    add_pattern_arguments(align)
+    mode = align.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
+        "--check",
+        action="store_true",
+        help="report files that would change and exit nonzero if any",
+    )
+    mode.add_argument(
+        "--write",
+        action="store_true",
+        help="write aligned files back to disk",
+    )
+    align.add_argument(
+        "--include",
+        default="*.py",
+        help="file name pattern to match in directories (default: %(default)s)",
+    )
+    align.add_argument(
+        "--cache",
+        default=DEFAULT_CACHE_PATH,
+        help="content hash cache file (default: %(default)s)",
+    )
+    align.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read or write the content hash cache",
+    )
+    align.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: CPU count)",
+    )
+    align.add_argument(
+        "--diff",
+        nargs="?",
+        const="HEAD",
+        default=None,
+        metavar="REV",
+        help="only align blocks touching lines changed since git revision "
+        "REV (default: HEAD)",
+    )
+    align.set_defaults(function=run_align)
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="serve alignment requests as JSON-RPC over stdin and stdout",
+    )
+    serve.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker threads handling requests",
+    )
+    serve.set_defaults(function=run_serve)
+
+    watch = subparsers.add_parser(
+        "watch",
+        help="re-align changed blocks of files whenever they are saved",
+    )
+    watch.add_argument(
+        "paths",
+        nargs="+",
+        help="files or directories to watch",
+    )
+    add_pattern_arguments(watch)
+    watch.add_argument(
+        "--include",
+        default="*.py",
+        help="file name pattern to match in directories (default: %(default)s)",
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="seconds between polls (default: %(default)s)",
+    )
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds a file must stop changing before it is aligned "
+        "(default: %(default)s)",
+    )
+    watch.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker threads aligning files",
+    )
+    watch.set_defaults(function=run_watch)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Run command line interface. Return exit code."""
+    args = get_parser().parse_args(argv)
+    if args.command is None:
+        from idlealign import check_installed
+
+        return 0 if check_installed() else 1
+    if not args.profile:
+        exit_code: int = args.function(args)
+        return exit_code
+    with Profile(
+        config.get_logs_dir(),
+        f"idlealign-{args.command}",
+    ) as profile:
+        exit_code = args.function(args)
+    print(
+        f"Wrote {profile.stats_path} and {profile.snapshot_path}",
+        file=sys.stderr,
+    )
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Config - Read IDLE extension configuration without importing idlelib."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "config"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import importlib.util
+import os
+from configparser import ConfigParser
+from contextlib import suppress
+from pathlib import Path
+from typing import TYPE_CHECKING, Final, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+# Extension that lets user configuration register extensions
+USER_EXTEND: Final = "idleuserextend"
+
+
+def get_idle_dir() -> Path | None:
+    """Return idlelib package directory without importing idlelib."""
+    spec = importlib.util.find_spec("idlelib")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return Path(next(iter(spec.submodule_search_locations)))
+
+
+def get_user_dir() -> Path:
+    """Return IDLE user configuration directory, like IDLE finds it.
+
+    Unlike IDLE, the directory is not created if it does not exist.
+    """
+    home = os.path.expanduser("~")
+    if home == "~" or not os.path.exists(home):
+        home = os.getcwd()
+    return Path(home) / ".idlerc"
+
+
+def get_logs_dir() -> Path:
+    """Return folder extension logs are written to, without importing IDLE."""
+    return get_user_dir() / "logs"
+
+
+def read_config(path: Path | None) -> ConfigParser:
+    """Return parsed configuration file, empty if it can not be read."""
+    parser = ConfigParser(interpolation=None, strict=False)
+    if path is not None:
+        with suppress(OSError, UnicodeDecodeError, ValueError):
+            parser.read(path, encoding="utf-8")
+    return parser
+
+
+class ExtensionStatus(NamedTuple):
+    """Registration state of one extension."""
+
+    name: str
+    registered: bool
+    enabled: bool
+
+
+class ExtensionConfig:
+    """IDLE's default and user extension configuration files.
+
+    Only the two config-extensions files are parsed, with plain
+    configparser, so neither idlelib nor tkinter are imported.
+    """
+
+    __slots__ = ("default", "default_path", "user", "user_path")
+
+    def __init__(
+        self,
+        idle_dir: Path | None = None,
+        user_dir: Path | None = None,
+    ) -> None:
+        """Read configuration files from IDLE and user directories."""
+        if idle_dir is None:
+            idle_dir = get_idle_dir()
+        if user_dir is None:
+            user_dir = get_user_dir()
+        self.default_path = (
+            None if idle_dir is None else idle_dir / "config-extensions.def"
+        )
+        self.user_path = user_dir / "config-extensions.cfg"
+        self.default = read_config(self.default_path)
+        self.user = read_config(self.user_path)
+
+    def get_option(self, section: str, option: str, default: str) -> str:
+        """Return option from user configuration, then default, then default."""
+        for parser in (self.user, self.default):
+            if parser.has_option(section, option):
+                return parser.get(section, option)
+        return default
+
+    def is_enabled(self, name: str) -> bool:
+        """Return if extension is enabled."""
+        value = self.get_option(name, "enable", "True")
+        return value.strip().lower() in {"1", "true", "yes", "on"}
+
+    def has_user_extend(self) -> bool:
+        """Return if user configuration can register extensions."""
+        registered = self.default.has_section(
+            USER_EXTEND,
+        ) or self.user.has_section(USER_EXTEND)
+        return registered and self.is_enabled(USER_EXTEND)
+
+    def get_registered(self) -> set[str]:
+        """Return names of sections IDLE will look for extensions in."""
+        sections = set(self.default.sections())
+        if self.has_user_extend():
+            sections |= set(self.user.sections())
+        return sections
+
+    def get_config_path(self) -> Path | None:
+        """Return path of configuration file extensions should be added to."""
+        if self.has_user_extend():
+            return self.user_path
+        return self.default_path
+
+    def check(self, names: Iterable[str]) -> dict[str, ExtensionStatus]:
+        """Return registration state of each named extension in one pass."""
+        registered = self.get_registered()
+        return {
+            name: ExtensionStatus(
+                name,
+                name in registered,
+                name in registered and self.is_enabled(name),
+            )
+            for name in names
+        }
+
+
+def check_installed(
+    extension: str,
+    version: str,
+    get_required_config: Callable[[], str],
+    config: ExtensionConfig | None = None,
+) -> bool:
+    """Make sure extension installed. Return True if installed correctly.
+
+    get_required_config is only called if the extension is missing, to
+    build the configuration text the user should add.
+    """
+    if config is None:
+        config = ExtensionConfig()
+    status = config.check((extension,))[extension]
+    if status.registered:
+        print(f"Configuration should be good! (v{version})")
+        return True
+
+    # Tell user how to add it to system list.
+    print(f"{extension} not in system registered extensions!")
+    print(
+        f"Please run the following command to add {extension} "
+        + "to system extensions list.\n",
+    )
+    # Make sure line-breaks will go properly in terminal
+    add_data = get_required_config().replace("\n", "\\n")
+    # Tell them the command
+    append = ">>" if config.has_user_extend() else "| sudo tee -a"
+    print(f"echo -e '{add_data}' {append} {config.get_config_path()}\n")
+    return False
@@ -0,0 +1,708 @@
+"""Engine - Headless alignment logic shared by the extension and tools."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "engine"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import re
+from typing import TYPE_CHECKING, Final, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+    from re import Pattern
+
+# Delimiters auto-detection will consider, in order of preference
+DELIMITER_CANDIDATES: Final = ("=", ":", "#", "|")
+# Maximum number of lines delimiter detection will look at
+DETECT_SAMPLE_SIZE: Final = 64
+# Pattern interpretation modes presets can use
+PATTERN_MODES: Final = ("regex", "literal")
+# Default alignment presets, name -> (pattern, space wrap, side, mode)
+DEFAULT_PRESETS: Final[dict[str, tuple[str, str, str, str]]] = {
+    "equals": ("=", "True", "left", "literal"),
+    "colon": (":", "True", "right", "literal"),
+    "comment": ("#", "True", "left", "literal"),
+    "pipe": ("|", "True", "left", "literal"),
+}
+PRESET_FIELDS: Final = ("pattern", "space_wrap", "side", "mode")
+
+
+def sample_line_numbers(
+    first: int,
+    last: int,
+    sample_size: int = DETECT_SAMPLE_SIZE,
+) -> range:
+    """Return evenly spaced line numbers from first to last inclusive.
+
+    At most sample_size line numbers are returned, so callers can
+    sample huge selections without scanning every line.
+    """
+    count = last - first + 1
+    if count <= 0:
+        return range(0)
+    step = max(1, -(-count // max(1, sample_size)))
+    return range(first, last + 1, step)
+
+
+def count_delimiters(lines: Iterable[str]) -> dict[str, int]:
+    """Return index of how many lines contain each delimiter candidate."""
+    counts = dict.fromkeys(DELIMITER_CANDIDATES, 0)
+    for line in lines:
+        for delimiter in DELIMITER_CANDIDATES:
+            if delimiter in line:
+                counts[delimiter] += 1
+    return counts
+
+
+def detect_delimiter(lines: Iterable[str]) -> str | None:
+    """Return the most common delimiter candidate in lines or None.
+
+    The best candidate is the one present on the most lines, with ties
+    going to whichever comes first in DELIMITER_CANDIDATES. A candidate
+    has to appear on at least two lines (or the only line there is) to
+    be worth aligning on.
+    """
+    lines = tuple(lines)
+    counts = count_delimiters(lines)
+    best = max(DELIMITER_CANDIDATES, key=counts.__getitem__)
+    if counts[best] < min(2, len(lines)) or not counts[best]:
+        return None
+    return best
+
+
+def get_indent(line: str) -> int:
+    """Return number of leading whitespace characters in line."""
+    return len(line) - len(line.lstrip())
+
+
+class IndentCodec:
+    """Convert leading indentation between tabs and spaces.
+
+    Tabs advance to the next multiple of tab_width, like an editor
+    shows them. Only indentation is converted, tabs after the first
+    non-whitespace character are left alone.
+    """
+
+    __slots__ = ("tab_width",)
+
+    def __init__(self, tab_width: int = 8) -> None:
+        """Initialize with width of a tab stop in columns."""
+        self.tab_width = max(1, tab_width)
+
+    def get_width(self, line: str) -> tuple[int, int]:
+        """Return (characters, columns) of leading indentation of line."""
+        column = 0
+        for index, char in enumerate(line):
+            if char == "\t":
+                column += self.tab_width - column % self.tab_width
+            elif char == " ":
+                column += 1
+            else:
+                return index, column
+        return len(line), column
+
+    def expand_line(self, line: str) -> str:
+        """Return line with leading indentation as spaces."""
+        if not line.startswith(("\t", " ")):
+            return line
+        length, width = self.get_width(line)
+        return " " * width + line[length:]
+
+    def compress_line(self, line: str) -> str:
+        """Return line with leading indentation as tabs where possible."""
+        length, width = self.get_width(line)
+        tabs, spaces = divmod(width, self.tab_width)
+        return "\t" * tabs + " " * spaces + line[length:]
+
+    def uses_tabs(self, line: str) -> bool:
+        """Return if leading indentation of line contains a tab."""
+        return "\t" in line[: self.get_width(line)[0]]
+
+    def expand(self, lines: Sequence[str]) -> list[str]:
+        """Return lines with leading indentation as spaces."""
+        return [self.expand_line(line) for line in lines]
+
+    def restore(
+        self,
+        new_lines: Sequence[str],
+        old_lines: Sequence[str],
+    ) -> list[str]:
+        """Return expanded new_lines with tabs put back like old_lines.
+
+        new_lines are old_lines after expand and some editing. Lines
+        that were not edited come back exactly as they were, edited
+        lines that were indented with tabs are indented with tabs again.
+        """
+        restored: list[str] = []
+        for new, old in zip(new_lines, old_lines, strict=True):
+            if not self.uses_tabs(old):
+                restored.append(new)
+            elif new == self.expand_line(old):
+                restored.append(old)
+            else:
+                restored.append(self.compress_line(new))
+        return restored
+
+
+def match_lines(
+    lines: Sequence[str],
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+) -> tuple[dict[int, tuple[str, str]], int]:
+    """Return split lines and the column to align them at.
+
+    Return value is ({index: (prefix, suffix)}, width) for each line
+    that matches pattern, where width is the length of the longest
+    prefix. Side False == left.
+    """
+    # Keeping track of lines to modify
+    line_data: dict[int, tuple[str, str]] = {}
+
+    # Finding min width excluding spaces of all lines till start of align pattern
+    sec_start = 0
+    for idx, line in enumerate(lines):
+        # Regular expression match
+        match = pattern.search(line)
+
+        if match is None:  # If align pattern not in line, skip line
+            continue
+
+        # Get the where alignment pattern starts and ends at
+        start, end = match.span()
+
+        prefix = line[:start]
+        align = line[start:end]
+        suffix = line[end:]
+
+        # If space wrap is set, wrap alignment text with spaces
+        if space_wrap:
+            align = f" {align} "
+
+        if not align_side:  # If align to left side
+            # Strip trailing spaces before align but keep indent
+            prefix = prefix.rstrip()
+            suffix = align + suffix.strip()  # Strip extra spaces
+        else:  # If align to right side
+            prefix += align.lstrip()
+            suffix = suffix.lstrip()
+
+        line_data[idx] = (prefix, suffix)  # Remember after we get max
+
+        sec_start = max(sec_start, len(prefix))  # Update max
+    return line_data, sec_start
+
+
+def pad_lines(
+    lines: Sequence[str],
+    line_data: dict[int, tuple[str, str]],
+    width: int,
+) -> list[str] | None:
+    """Return lines with split lines padded to width or None if unchanged."""
+    new_lines = list(lines)
+    changed = False
+    # For each line that had align pattern, add or remove spaces from
+    # start up to pattern so each pattern starts in the same column
+    for key, (prefix, suffix) in line_data.items():
+        new = prefix.ljust(width) + suffix
+
+        if new_lines[key] != new:
+            changed = True
+            new_lines[key] = new
+
+    if not changed:
+        return None
+    return new_lines
+
+
+def align_lines(
+    lines: Sequence[str],
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+    codec: IndentCodec | None = None,
+) -> list[str] | None:
+    """Return lines aligned by pattern or None if nothing would change.
+
+    Side False == left. Lines without a match of pattern are left as is.
+    If codec is given, lines indented with tabs are aligned as if
+    indented with spaces and get their tabs back afterwards.
+    """
+    if codec is not None and any(map(codec.uses_tabs, lines)):
+        new_lines = align_lines(
+            codec.expand(lines),
+            pattern,
+            space_wrap,
+            align_side,
+        )
+        if new_lines is None:
+            return None
+        return codec.restore(new_lines, lines)
+    line_data, width = match_lines(lines, pattern, space_wrap, align_side)
+    if not line_data:
+        # There are no lines with selected pattern
+        return None
+    return pad_lines(lines, line_data, width)
+
+
+def is_aligned(
+    lines: Sequence[str],
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+) -> bool:
+    """Return if align_lines would leave lines unchanged.
+
+    Unlike align_lines, this stops at the first line that proves
+    something would change, and builds no new lines.
+    """
+    column = -1
+    tight = False
+    for line in lines:
+        match = pattern.search(line)
+        if match is None:
+            continue
+        start, end = match.span()
+        prefix = line[:start]
+        align = line[start:end]
+        suffix = line[end:]
+        if space_wrap:
+            align = f" {align} "
+        if not align_side:
+            prefix = prefix.rstrip()
+            suffix = align + suffix.strip()
+        else:
+            prefix += align.lstrip()
+            suffix = suffix.lstrip()
+        # Aligned lines are prefix, then spaces, then suffix
+        head_length = len(line) - len(suffix)
+        if (
+            not line.endswith(suffix)
+            or not line.startswith(prefix)
+            or head_length < len(prefix)
+            or line[len(prefix) : head_length].strip(" ")
+        ):
+            return False
+        if column < 0:
+            column = head_length
+        elif head_length != column:
+            return False
+        tight = tight or head_length == len(prefix)
+    # Padding wider than the longest prefix would be shrunk
+    return column < 0 or tight
+
+
+def find_blocks(
+    lines: Sequence[str],
+    pattern: Pattern[str],
+    same_indent: bool = True,
+    min_lines: int = 2,
+) -> list[tuple[int, int]]:
+    """Return (start, end) index ranges of blocks of lines to align.
+
+    A block is a run of consecutive lines that all match pattern and,
+    if same_indent is set, all have the same indentation. End indexes
+    are exclusive. Blocks shorter than min_lines are skipped.
+    """
+    blocks: list[tuple[int, int]] = []
+    start = -1
+    indent = -1
+    for idx, line in enumerate(lines):
+        matches = pattern.search(line) is not None
+        line_indent = get_indent(line) if matches and same_indent else -1
+        if start >= 0 and (not matches or line_indent != indent):
+            if idx - start >= min_lines:
+                blocks.append((start, idx))
+            start = -1
+        if matches and start < 0:
+            start = idx
+            indent = line_indent
+    if start >= 0 and len(lines) - start >= min_lines:
+        blocks.append((start, len(lines)))
+    return blocks
+
+
+def find_block_around(
+    lines: Sequence[str],
+    index: int,
+    pattern: Pattern[str],
+    same_indent: bool = True,
+) -> tuple[int, int] | None:
+    """Return (start, end) of block of lines containing index or None.
+
+    Like find_blocks, but only looks at lines next to index, so cost
+    depends on the size of the block rather than of all lines. Returns
+    None if the line at index does not match pattern.
+    """
+    if not 0 <= index < len(lines) or pattern.search(lines[index]) is None:
+        return None
+    indent = get_indent(lines[index])
+
+    def in_block(line: str) -> bool:
+        """Return if line belongs in the same block."""
+        if same_indent and get_indent(line) != indent:
+            return False
+        return pattern.search(line) is not None
+
+    start = index
+    while start > 0 and in_block(lines[start - 1]):
+        start -= 1
+    end = index + 1
+    while end < len(lines) and in_block(lines[end]):
+        end += 1
+    return start, end
+
+
+def expand_blocks(
+    lines: Sequence[str],
+    line_ranges: Iterable[tuple[int, int]],
+    pattern: Pattern[str],
+    same_indent: bool = True,
+    min_lines: int = 2,
+) -> list[tuple[int, int]]:
+    """Return blocks of lines that touch any of line_ranges.
+
+    Line ranges are inclusive (first, last) indexes into lines, for
+    example changed lines from a diff. Each touched line is expanded to
+    its surrounding block like find_blocks would find it.
+    """
+    blocks: dict[tuple[int, int], None] = {}
+    for first, last in line_ranges:
+        index = max(0, first)
+        while index <= min(last, len(lines) - 1):
+            block = find_block_around(lines, index, pattern, same_indent)
+            if block is None:
+                index += 1
+                continue
+            if block[1] - block[0] >= min_lines:
+                blocks[block] = None
+            index = block[1]
+    return sorted(blocks)
+
+
+def align_blocks(
+    lines: Sequence[str],
+    blocks: Iterable[tuple[int, int]],
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+    codec: IndentCodec | None = None,
+) -> list[tuple[int, list[str]]]:
+    """Align each block independently, return changed blocks.
+
+    Blocks are (start, end) index ranges into lines, as from
+    find_blocks. Return value is a list of (start, new_lines) tuples in
+    the order blocks were given, only including blocks that changed.
+    For codec, see align_lines.
+    """
+    changes: list[tuple[int, list[str]]] = []
+    for start, end in blocks:
+        new_lines = align_lines(
+            lines[start:end],
+            pattern,
+            space_wrap,
+            align_side,
+            codec,
+        )
+        if new_lines is not None:
+            changes.append((start, new_lines))
+    return changes
+
+
+def get_padding(
+    lines: Sequence[str],
+    pattern: Pattern[str],
+    align_side: bool = False,
+    same_indent: bool = True,
+    min_lines: int = 2,
+) -> dict[int, int]:
+    """Return {index: columns} to shift lines right so matches line up.
+
+    Used for display-only alignment, where text can not be changed and
+    whole lines are shifted instead. Each block from find_blocks is
+    lined up on the start of matches, or on their end if align_side is
+    set. Lines that need no shift are left out.
+    """
+    padding: dict[int, int] = {}
+    for start, end in find_blocks(lines, pattern, same_indent, min_lines):
+        columns: dict[int, int] = {}
+        for idx in range(start, end):
+            match = pattern.search(lines[idx])
+            assert match is not None, "Blocks only contain matching lines"
+            columns[idx] = match.end() if align_side else match.start()
+        widest = max(columns.values())
+        for idx, column in columns.items():
+            if column < widest:
+                padding[idx] = widest - column
+    return padding
+
+
+def align_text(
+    text: str,
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+    line_ranges: Iterable[tuple[int, int]] | None = None,
+) -> str | None:
+    """Return whole text with each block aligned or None if unchanged.
+
+    If line_ranges are given, only blocks touching those inclusive
+    (first, last) line indexes are aligned, see expand_blocks.
+    Line endings (including carriage returns) are kept as they were.
+    """
+    lines = text.split("\n")
+    carriage = [line.endswith("\r") for line in lines]
+    bare = [
+        line[:-1] if has_cr else line
+        for line, has_cr in zip(lines, carriage, strict=True)
+    ]
+    if line_ranges is None:
+        blocks = find_blocks(bare, pattern)
+    else:
+        blocks = expand_blocks(bare, line_ranges, pattern)
+    changes = align_blocks(
+        bare,
+        blocks,
+        pattern,
+        space_wrap,
+        align_side,
+    )
+    if not changes:
+        return None
+    for start, new_lines in changes:
+        for idx, new in enumerate(new_lines, start):
+            lines[idx] = f"{new}\r" if carriage[idx] else new
+    return "\n".join(lines)
+
+
+def is_text_aligned(
+    text: str,
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+    line_ranges: Iterable[tuple[int, int]] | None = None,
+) -> bool:
+    """Return if align_text would leave text unchanged.
+
+    Stops at the first block that would change.
+    """
+    lines = [line.removesuffix("\r") for line in text.split("\n")]
+    if line_ranges is None:
+        blocks = find_blocks(lines, pattern)
+    else:
+        blocks = expand_blocks(lines, line_ranges, pattern)
+    return all(
+        is_aligned(lines[start:end], pattern, space_wrap, align_side)
+        for start, end in blocks
+    )
+
+
+class LineEdit(NamedTuple):
+    """Replacement of old with new starting at column of line."""
+
+    line: int
+    column: int
+    old: str
+    new: str
+
+
+def get_line_edit(line: int, old: str, new: str) -> LineEdit | None:
+    """Return smallest edit turning old line into new or None if equal.
+
+    Only the part between the common prefix and suffix of old and new
+    is kept, which for alignment is usually a run of spaces.
+    """
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    return LineEdit(
+        line,
+        start,
+        old[start : len(old) - end],
+        new[start : len(new) - end],
+    )
+
+
+def get_line_edits(
+    old_lines: Sequence[str],
+    new_lines: Sequence[str],
+    first_line: int = 0,
+) -> list[LineEdit]:
+    """Return edits turning old_lines into new_lines, one per changed line.
+
+    Both sequences must have the same length. Edit line numbers start
+    at first_line.
+    """
+    edits: list[LineEdit] = []
+    for line, (old, new) in enumerate(
+        zip(old_lines, new_lines, strict=True),
+        first_line,
+    ):
+        edit = get_line_edit(line, old, new)
+        if edit is not None:
+            edits.append(edit)
+    return edits
+
+
+def apply_line_edit(line: str, edit: LineEdit) -> str:
+    """Return line with edit applied."""
+    return line[: edit.column] + edit.new + line[edit.column + len(edit.old) :]
+
+
+def revert_line_edit(line: str, edit: LineEdit) -> str:
+    """Return line as it was before edit was applied."""
+    return line[: edit.column] + edit.old + line[edit.column + len(edit.new) :]
+
+
+def align_band(
+    bands: Sequence[str],
+    column: int,
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+) -> list[LineEdit]:
+    """Return edits aligning a rectangular band of text by pattern.
+
+    bands are the parts of consecutive lines between two columns, with
+    column being where the band starts on each line. Only text inside
+    the band is looked at, and edit columns are offset by column, so
+    they apply to the full lines. Edit line numbers are band indexes.
+    Whitespace at the end of each band is kept, so text right of the
+    band stays separated from it.
+    """
+    stripped = [band.rstrip() for band in bands]
+    new_bands = align_lines(stripped, pattern, space_wrap, align_side)
+    if new_bands is None:
+        return []
+    new_bands = [
+        new + band[len(old) :]
+        for new, old, band in zip(new_bands, stripped, bands, strict=True)
+    ]
+    return [
+        edit._replace(column=edit.column + column)
+        for edit in get_line_edits(bands, new_bands)
+    ]
+
+
+# Characters with special meaning in a regular expression
+REGEX_SPECIAL: Final = frozenset(".^$*+?{}[]|()")
+
+
+def parse_literal(source: str) -> str | None:
+    """Return text regular expression source matches or None.
+
+    Only escaped punctuation and characters without special meaning
+    are allowed, anything else gives None. Flags are not looked at.
+    """
+    literal: list[str] = []
+    index = 0
+    while index < len(source):
+        char = source[index]
+        if char == "\\":
+            index += 1
+            if index == len(source) or source[index].isalnum():
+                # Trailing backslash or escape like \d or \n
+                return None
+            char = source[index]
+        elif char in REGEX_SPECIAL:
+            return None
+        literal.append(char)
+        index += 1
+    return "".join(literal)
+
+
+def get_literal(pattern: Pattern[str]) -> str | None:
+    """Return text pattern matches literally or None if not a literal.
+
+    Patterns made by compile_pattern in literal mode always give back
+    the original text. Ignoring case is allowed if the text has no
+    letters with case, like the delimiters the search dialog escapes
+    and compiles with re.IGNORECASE by default.
+    """
+    flags = pattern.flags & ~re.UNICODE
+    if flags & ~re.IGNORECASE:
+        return None
+    literal = parse_literal(pattern.pattern)
+    if literal is not None and flags and literal.lower() != literal.upper():
+        return None
+    return literal
+
+
+class AlignPreset(NamedTuple):
+    """Named alignment options with a precompiled pattern."""
+
+    name: str
+    pattern: Pattern[str]
+    space_wrap: bool = True
+    align_side: bool = False
+
+
+def compile_pattern(pattern: str, mode: str = "regex") -> Pattern[str]:
+    """Return compiled pattern, escaping it first in literal mode.
+
+    Raises ValueError on unknown mode and re.error on invalid pattern.
+    """
+    if mode not in PATTERN_MODES:
+        raise ValueError(
+            f"Unknown pattern mode {mode!r}, expected one of {PATTERN_MODES}",
+        )
+    if mode == "literal":
+        pattern = re.escape(pattern)
+    return re.compile(pattern)
+
+
+def parse_preset(
+    name: str,
+    pattern: str,
+    space_wrap: bool = True,
+    side: str = "left",
+    mode: str = "regex",
+) -> AlignPreset:
+    """Return AlignPreset from configuration values.
+
+    Raises ValueError if side or mode are invalid or if pattern is empty.
+    """
+    if not pattern:
+        raise ValueError(f"Preset {name!r} has an empty pattern")
+    side = side.strip().lower()
+    if side not in {"left", "right"}:
+        raise ValueError(
+            f"Preset {name!r} side must be 'left' or 'right', not {side!r}",
+        )
+    return AlignPreset(
+        name=name,
+        pattern=compile_pattern(pattern, mode.strip().lower()),
+        space_wrap=space_wrap,
+        align_side=side == "right",
+    )
+
+
+def get_default_preset(name: str) -> AlignPreset:
+    """Return default preset by name. Raises KeyError if it does not exist."""
+    pattern, space_wrap, side, mode = DEFAULT_PRESETS[name]
+    return parse_preset(name, pattern, space_wrap == "True", side, mode)
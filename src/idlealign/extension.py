@@ -23,28 +23,90 @@ __title__ = "extension"
 __author__ = "CoolCat467"
 __license__ = "GNU General Public License Version 3"
 
+import contextlib
+import os
+import re
+import subprocess
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from idlelib import searchengine
+from idlelib.config import idleConf
 from idlelib.searchbase import SearchDialogBase
-from tkinter import BooleanVar, Event, Frame, Tk, Variable
+from tkinter import (
+    BooleanVar,
+    Event,
+    Frame,
+    TclError,
+    Text,
+    Tk,
+    Toplevel,
+    Variable,
+    messagebox,
+)
+from tkinter.font import Font
 from tkinter.ttk import Checkbutton, Radiobutton
-from typing import TYPE_CHECKING, Any, ClassVar, cast
+from typing import TYPE_CHECKING, Any, ClassVar, Final, cast
 
-from idlealign import utils
+from idlealign import engine as align_engine, gitdiff, utils
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Callable, Hashable, Sequence
+    from concurrent.futures import Future
+    from idlelib.editor import EditorWindow
+    from idlelib.pyshell import PyShellEditorWindow
     from re import Pattern
 
+# Default key binds for default presets
+DEFAULT_PRESET_KEYS: dict[str, str] = {
+    "equals": "<Alt-Key-equal>",
+    "colon": "<Alt-Key-colon>",
+    "comment": "<Alt-Key-numbersign>",
+    "pipe": "<Alt-Key-bar>",
+}
+
+
+# Letters re.IGNORECASE matches with characters Tcl's -nocase does not,
+# such as the dotless i and long s
+NOCASE_MISMATCHES: Final = frozenset("iIsS")
+
+
+def can_search_nocase(literal: str) -> bool:
+    """Return if Tcl's -nocase search matches literal like re.IGNORECASE.
+
+    Both fold case the same way for ASCII letters apart from a few
+    with special matches, and characters without case are unaffected.
+    """
+    return all(
+        (char.isascii() and char not in NOCASE_MISMATCHES)
+        or char.lower() == char.upper()
+        for char in literal
+    )
+
+
+def get_preset_values() -> dict[str, str]:
+    """Return configuration values for default presets."""
+    return {
+        f"preset_{name}_{field}": value
+        for name, preset in align_engine.DEFAULT_PRESETS.items()
+        for field, value in zip(
+            align_engine.PRESET_FIELDS,
+            preset,
+            strict=True,
+        )
+    }
+
 
 class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
     """Dialog for aligning by a pattern in text."""
 
     __slots__ = (
         "align_side_var",
-        "extension",
+        "extension_ref",
         "global_search_params",
         "insert_tags",
         "prev_search_params",
+        "rectangle_var",
         "search_params",
         "selection",
         "space_wrap_var",
@@ -67,8 +129,11 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
         Attributes
         ----------
             space_wrap_var: BooleanVar of if the align text should be wrapped with spaces
+            rectangle_var: BooleanVar of if only the columns between the
+                selection start and end should be aligned
             insert_tags: Optional string of tags for text insert
-            extension: Extension class
+            extension_ref: Weak reference to extension instance, so the
+                dialog does not keep a closed editor window alive
             prev_search_params: Dictionary of search parameters before opening window
 
         """
@@ -80,8 +145,10 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
             True,
         )  # Space wrap alignment pattern?
         self.align_side_var = BooleanVar(root, False)  # Alignment side var
+        # Only align between selection start and end columns?
+        self.rectangle_var = BooleanVar(root, False)
 
-        self.extension = extension
+        self.extension_ref = weakref.ref(extension)
 
         self.global_search_params: dict[str, str | bool]
         self.search_params: dict[str, str | bool] = {
@@ -91,6 +158,14 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
 
         self.selection = utils.get_selected_text_indexes(self.extension.text)
 
+    @property
+    def extension(self) -> idlealign:
+        """Extension instance of editor window this dialog belongs to."""
+        extension = self.extension_ref()
+        if extension is None:
+            raise RuntimeError("Editor window of align dialog was closed")
+        return extension
+
     def load_prefs(self) -> None:
         """Load search engine preferences."""
         self.global_search_params = utils.get_search_engine_params(self.engine)
@@ -120,11 +195,20 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
 
         text = self.extension.text
 
+        self.selection = utils.get_selected_text_indexes(text)
+
+        if searchphrase is None:
+            # Pre-fill pattern with the most likely delimiter
+            delimiter = self.extension.detect_delimiter(self.selection)
+            if delimiter is not None:
+                searchphrase = (
+                    re.escape(delimiter) if self.engine.isre() else delimiter
+                )
+
         super().open(text, searchphrase)
 
         self.insert_tags = insert_tags
 
-        self.selection = utils.get_selected_text_indexes(text)
         utils.show_hit(text, *self.selection)
 
     def close(self, event: Event[Any] | None = None) -> None:
@@ -144,7 +228,10 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
         frame: Frame
         base_options: list[tuple[Variable, str]]
         frame, base_options = super().create_option_buttons()
-        options = [(self.space_wrap_var, "Space wrap")]
+        options = [
+            (self.space_wrap_var, "Space wrap"),
+            (self.rectangle_var, "Rectangle"),
+        ]
         for var, label in options:
             btn = Checkbutton(frame, variable=var, text=label)
             btn.pack(side="left", fill="both")
@@ -165,6 +252,10 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
         """Create command buttons."""
         super().create_command_buttons()
         self.make_button("Align", self.default_command, isdef=True)
+        self.make_button("Align Blocks", self.align_blocks_command)
+        self.make_button("Align Hits", self.align_hits_command)
+        self.make_button("Align Changes", self.align_changed_command)
+        self.make_button("Align All Files", self.align_open_files_command)
 
     def default_command(self, _event: Event[Any] | None = None) -> bool:
         """Handle align again as the default command."""
@@ -179,7 +270,10 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
         space_wrap: bool = self.space_wrap_var.get()
         align_side: bool = self.align_side_var.get()
 
-        close = self.extension.align_selection(
+        align = self.extension.align_selection
+        if self.rectangle_var.get():
+            align = self.extension.align_rectangle
+        close = align(
             self.selection,
             pattern,
             space_wrap,
@@ -195,6 +289,280 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
             self.bell()
         return close
 
+    def align_blocks_command(self, _event: Event[Any] | None = None) -> bool:
+        """Align each block of matching lines in selection separately."""
+        pattern = self.engine.getprog()
+        if not pattern:
+            return False
+
+        close = self.extension.align_blocks(
+            self.selection,
+            pattern,
+            self.space_wrap_var.get(),
+            self.align_side_var.get(),
+            self.insert_tags,
+        )
+
+        if close:
+            self.close()
+        else:
+            self.bell()
+        return close
+
+    def align_hits_command(self, _event: Event[Any] | None = None) -> bool:
+        """Align each region tagged as a hit separately."""
+        pattern = self.engine.getprog()
+        if not pattern:
+            return False
+
+        close = self.extension.align_tagged(
+            "hit",
+            pattern,
+            self.space_wrap_var.get(),
+            self.align_side_var.get(),
+            self.insert_tags,
+        )
+
+        if close:
+            self.close()
+        else:
+            self.bell()
+        return close
+
+    def align_changed_command(self, _event: Event[Any] | None = None) -> bool:
+        """Align blocks touching lines changed since the last git commit."""
+        pattern = self.engine.getprog()
+        if not pattern:
+            return False
+
+        close = self.extension.align_changed_blocks(
+            pattern,
+            self.space_wrap_var.get(),
+            self.align_side_var.get(),
+        )
+
+        if close:
+            self.close()
+        else:
+            self.bell()
+        return close
+
+    def align_open_files_command(
+        self,
+        _event: Event[Any] | None = None,
+    ) -> bool:
+        """Align blocks of matching lines in every open editor window."""
+        pattern = self.engine.getprog()
+        if not pattern:
+            return False
+
+        changed = self.extension.align_open_files(
+            pattern,
+            self.space_wrap_var.get(),
+            self.align_side_var.get(),
+        )
+
+        if changed:
+            self.close()
+        else:
+            self.bell()
+        return bool(changed)
+
+
+class AlignMemo:
+    """Remember regions known to be aligned, so aligning again is instant.
+
+    Each region is keyed by its bounds, pattern and options, and stores
+    the change counter of the editor window and a hash of the region's
+    text from when it was last seen aligned. If the counter is unchanged
+    the text is too, and nothing has to be fetched. Otherwise the hash
+    still saves matching and padding lines that were not touched.
+    """
+
+    __slots__ = ("entries", "size")
+
+    def __init__(self, size: int = 16) -> None:
+        """Initialize empty memo holding at most size regions."""
+        self.size = size
+        self.entries: OrderedDict[Hashable, tuple[int, int]] = OrderedDict()
+
+    def get(self, key: Hashable) -> tuple[int, int] | None:
+        """Return (change count, text hash) of aligned region or None."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def add(self, key: Hashable, count: int, digest: int) -> None:
+        """Remember region is aligned at change count with text hash."""
+        self.entries[key] = (count, digest)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class VirtualAlignment:
+    """Display-only alignment of the visible lines of a text widget.
+
+    Text is never changed. Instead, each matching line is shifted right
+    with a left margin tag so matches line up, which leaves undo
+    history, colorizing and the saved state alone. Only the lines on
+    screen, plus some context above and below for blocks running off
+    screen, are looked at. Lines are recomputed shortly after the view
+    scrolls or resizes, which Tk reports through the y scroll command,
+    or the text changes, which the change counter reports.
+    """
+
+    __slots__ = (
+        "after_id",
+        "align_side",
+        "changes",
+        "char_width",
+        "last_view",
+        "pattern",
+        "scroll_callback",
+        "scroll_command",
+        "tab_width",
+        "tags",
+        "text",
+    )
+
+    # Tag name prefix, one tag per margin width
+    TAG_PREFIX: ClassVar = "idlealign_virtual_"
+    # Lines above and below the view looked at for blocks off screen
+    CONTEXT_LINES: ClassVar = 100
+    # Milliseconds to wait after a change, so bursts refresh only once
+    REFRESH_DELAY: ClassVar = 50
+
+    def __init__(
+        self,
+        text: Text,
+        pattern: Pattern[str],
+        changes: utils.ChangeCounter,
+        align_side: bool = False,
+        tab_width: int = 8,
+    ) -> None:
+        """Initialize virtual alignment of text, does not start it."""
+        self.text = text
+        self.pattern = pattern
+        self.changes = changes
+        self.align_side = align_side
+        self.tab_width = tab_width
+        self.char_width = Font(font=text.cget("font")).measure("0")
+        self.after_id: str | None = None
+        # Original y scroll command and the one passing calls on to it
+        self.scroll_command: str | None = None
+        self.scroll_callback: str | None = None
+        self.last_view: tuple[int, int, int] | None = None
+        self.tags: set[str] = set()
+
+    def get_view(self) -> tuple[int, int]:
+        """Return first and last line numbers currently on screen."""
+        first = utils.get_line_col(self.text.index("@0,0"))[0]
+        last = utils.get_line_col(
+            self.text.index(f"@0,{self.text.winfo_height()}"),
+        )[0]
+        return first, last
+
+    def refresh(self) -> None:
+        """Recompute margins of lines around the view if it changed."""
+        first, last = self.get_view()
+        view = (first, last, self.changes.count)
+        if view == self.last_view:
+            return
+        self.last_view = view
+
+        total = utils.get_line_col(self.text.index("end-1c"))[0]
+        start = max(1, first - self.CONTEXT_LINES)
+        end = min(total, last + self.CONTEXT_LINES)
+        chars: str = self.text.get(f"{start}.0", f"{end}.0 lineend")
+        lines = [line.expandtabs(self.tab_width) for line in chars.split("\n")]
+        padding = align_engine.get_padding(
+            lines,
+            self.pattern,
+            self.align_side,
+        )
+        self.clear(f"{start}.0", f"{end}.0 lineend")
+        for index, columns in padding.items():
+            tag = self.get_tag(columns)
+            line = start + index
+            self.text.tag_add(tag, f"{line}.0", f"{line}.0 lineend")
+
+    def get_tag(self, columns: int) -> str:
+        """Return tag shifting lines right by columns, creating it if new."""
+        tag = f"{self.TAG_PREFIX}{columns}"
+        if tag not in self.tags:
+            margin = columns * self.char_width
+            self.text.tag_configure(tag, lmargin1=margin, lmargin2=margin)
+            self.tags.add(tag)
+        return tag
+
+    def clear(self, start: str = "1.0", end: str = "end") -> None:
+        """Remove margins from lines between start and end."""
+        for tag in self.tags:
+            self.text.tag_remove(tag, start, end)
+
+    def scheduled_refresh(self) -> None:
+        """Refresh once scheduled time comes."""
+        self.after_id = None
+        with contextlib.suppress(TclError):
+            # Widget could have been destroyed since
+            self.refresh()
+
+    def schedule(self) -> None:
+        """Refresh soon, unless a refresh is already pending."""
+        if self.after_id is not None:
+            return
+        with contextlib.suppress(TclError):
+            self.after_id = self.text.after(
+                self.REFRESH_DELAY,
+                self.scheduled_refresh,
+            )
+
+    def view_changed(self, *args: str) -> None:
+        """Pass scroll position on to scroll bar and schedule refresh."""
+        if self.scroll_command:
+            self.text.tk.call(
+                *self.text.tk.splitlist(self.scroll_command),
+                *args,
+            )
+        self.schedule()
+
+    def start(self) -> None:
+        """Start aligning lines as they come into view."""
+        self.last_view = None
+        self.scroll_command = str(self.text.cget("yscrollcommand"))
+        self.scroll_callback = self.text.register(self.view_changed)
+        self.text.configure(yscrollcommand=self.scroll_callback)
+        self.changes.callbacks.append(self.schedule)
+        self.schedule()
+
+    def stop(self) -> None:
+        """Stop and remove all virtual alignment."""
+        with contextlib.suppress(ValueError):
+            self.changes.callbacks.remove(self.schedule)
+        try:
+            if self.after_id is not None:
+                self.text.after_cancel(self.after_id)
+            if self.scroll_callback is not None:
+                # Leave it alone if something else took it over since
+                if str(self.text.cget("yscrollcommand")) == (
+                    self.scroll_callback
+                ):
+                    self.text.configure(
+                        yscrollcommand=self.scroll_command or "",
+                    )
+                self.text.deletecommand(self.scroll_callback)
+            for tag in self.tags:
+                self.text.tag_delete(tag)
+        except TclError:
+            pass
+        self.after_id = None
+        self.scroll_command = None
+        self.scroll_callback = None
+        self.tags.clear()
+        self.last_view = None
+
 
 # Important weird: If event handler function returns 'break',
 # then it prevents other bindings of same event type from running.
@@ -204,20 +572,143 @@ class AlignDialog(SearchDialogBase):  # type: ignore[misc,unused-ignore]
 class idlealign(utils.BaseExtension):  # noqa: N801
     """Add comments from mypy to an open program."""
 
-    __slots__ = ()
+    __slots__ = ("__weakref__", "memo", "virtual")
 
     # Extend the file and format menus.
     menudefs: ClassVar[
         Sequence[tuple[str, Sequence[tuple[str, str] | None]]]
     ] = [
-        ("format", [("Align Selection", "<<align-selection>>")]),
+        (
+            "format",
+            [
+                ("Align Selection", "<<align-selection>>"),
+                ("Toggle Virtual Align", "<<toggle-virtual-align>>"),
+                ("Align Stats", "<<align-stats>>"),
+            ],
+        ),
     ]
 
+    # Default values for configuration file
+    values: ClassVar[dict[str, str]] = {
+        **utils.BaseExtension.values,
+        **get_preset_values(),
+        "record_stats": "False",
+        "profile": "False",
+        "tcl_prefilter": "False",
+    }
+
     # Default key binds for configuration file
     bind_defaults: ClassVar = {
         "align-selection": "<Alt-Key-a>",
+        "toggle-virtual-align": None,
+        "align-stats": None,
+        **{
+            f"align-preset-{name}": key
+            for name, key in DEFAULT_PRESET_KEYS.items()
+        },
     }
 
+    # Record alignment timings, see Align Stats
+    record_stats: ClassVar[str] = "False"
+    # Write cProfile and tracemalloc results of alignments to logs folder
+    profile: ClassVar[str] = "False"
+    # Find matching lines with Tk's search before fetching any text
+    tcl_prefilter: ClassVar[str] = "False"
+
+    # Alignment presets compiled when configuration is loaded
+    presets: ClassVar[dict[str, align_engine.AlignPreset]] = {}
+
+    # Align dialog of each editor window, dropped when window goes away
+    dialogs: ClassVar[weakref.WeakKeyDictionary[EditorWindow, AlignDialog]] = (
+        weakref.WeakKeyDictionary()
+    )
+
+    def __init__(self, editwin: PyShellEditorWindow) -> None:
+        """Initialize extension and bind preset events."""
+        super().__init__(editwin)
+
+        # Display-only alignment, when turned on
+        self.virtual: VirtualAlignment | None = None
+        # Regions known to be aligned already
+        self.memo = AlignMemo()
+
+        for name in self.presets:
+            self.text.bind(
+                f"<<align-preset-{name}>>",
+                self.get_preset_event_handler(name),
+            )
+
+        # Build dialog once the window is up so it opens instantly
+        self.text.after_idle(self.prewarm_window)
+
+    @classmethod
+    def get_preset_names(cls) -> list[str]:
+        """Return names of all presets in configuration, defaults first."""
+        names = dict.fromkeys(align_engine.DEFAULT_PRESETS)
+        prefix = "preset_"
+        suffix = "_pattern"
+        for config in (idleConf.defaultCfg, idleConf.userCfg):
+            parser = config["extensions"]
+            if not parser.has_section(cls.__name__):
+                continue
+            for option in map(str, parser.GetOptionList(cls.__name__)):
+                if option.startswith(prefix) and option.endswith(suffix):
+                    names[option[len(prefix) : -len(suffix)]] = None
+        return list(names)
+
+    @classmethod
+    def get_preset_option(cls, name: str, field: str, default: str) -> str:
+        """Return raw preset field value from configuration."""
+        value = idleConf.GetOption(
+            "extensions",
+            cls.__name__,
+            f"preset_{name}_{field}",
+            default=default,
+            warn_on_default=False,
+            raw=True,
+        )
+        return str(value)
+
+    @classmethod
+    def load_presets(cls) -> dict[str, align_engine.AlignPreset]:
+        """Return presets from configuration with patterns compiled.
+
+        Invalid presets are logged and skipped.
+        """
+        presets: dict[str, align_engine.AlignPreset] = {}
+        for name in cls.get_preset_names():
+            defaults = align_engine.DEFAULT_PRESETS.get(
+                name,
+                ("", "True", "left", "regex"),
+            )
+            pattern, space_wrap, side, mode = (
+                cls.get_preset_option(name, field, default)
+                for field, default in zip(
+                    align_engine.PRESET_FIELDS,
+                    defaults,
+                    strict=True,
+                )
+            )
+            try:
+                presets[name] = align_engine.parse_preset(
+                    name,
+                    pattern,
+                    space_wrap.strip().lower() == "true",
+                    side,
+                    mode,
+                )
+            except (ValueError, re.error) as exc:
+                utils.extension_log_exception(exc)
+        return presets
+
+    @classmethod
+    def reload(cls) -> None:
+        """Load class variables and compile presets from configuration."""
+        super().reload()
+        cls.presets = cls.load_presets()
+        utils.set_stats_enabled(str(cls.record_stats).lower() == "true")
+        utils.set_profile_enabled(str(cls.profile).lower() == "true")
+
     @property
     def window(self) -> AlignDialog:
         """Window for current text widget."""
@@ -225,24 +716,111 @@ class idlealign(utils.BaseExtension):  # noqa: N801
 
     @utils.log_exceptions
     def create_window(self) -> AlignDialog:
-        """Create align dialog window."""
-        root: Tk
-        root = self.text._root()  # type: ignore[attr-defined]
+        """Return align dialog of this editor window, creating it if needed."""
+        dialog = self.dialogs.get(self.editwin)
+        if dialog is None:
+            root: Tk
+            root = self.text._root()  # type: ignore[attr-defined]
+            dialog = AlignDialog(root, searchengine.get(root), self)
+            self.dialogs[self.editwin] = dialog
+        return dialog
+
+    def prewarm_window(self) -> None:
+        """Create align dialog widgets ahead of time and keep them hidden."""
+        try:
+            dialog = self.create_window()
+            if not dialog.top:
+                dialog.create_widgets()
+                cast("Toplevel", dialog.top).withdraw()
+        except TclError:
+            # Window was closed before it was idle
+            return
+
+    def close_window(self) -> None:
+        """Destroy align dialog of this editor window if it exists."""
+        dialog = self.dialogs.pop(self.editwin, None)
+        if dialog is not None and dialog.top:
+            with contextlib.suppress(TclError):
+                dialog.top.destroy()
+            dialog.top = None
+
+    def get_sample_lines(self, selection: tuple[str, str]) -> list[str]:
+        """Return evenly sampled lines from selection.
+
+        Small selections are fetched in one go, large ones only have
+        the sampled lines transferred from the text widget.
+        """
+        first, last = (utils.get_line_col(index)[0] for index in selection)
+        line_numbers = align_engine.sample_line_numbers(first, last)
+        if line_numbers.step == 1:
+            chars: str = self.text.get(
+                *utils.get_line_selection(first, last - first + 1),
+            )
+            return chars.removesuffix("\n").split("\n")
+        return [self.get_line(line).rstrip("\n") for line in line_numbers]
 
-        engine: searchengine.SearchEngine = searchengine.get(root)
+    def detect_delimiter(self, selection: tuple[str, str]) -> str | None:
+        """Return most likely alignment delimiter in selection or None."""
+        return align_engine.detect_delimiter(self.get_sample_lines(selection))
 
-        if not hasattr(engine, "_aligndialog"):
-            engine._aligndialog = AlignDialog(  # type: ignore[attr-defined,unused-ignore]
-                root,
-                engine,
-                self,
+    def search_lines(
+        self,
+        pattern: Pattern[str],
+        start: str,
+        end: str,
+    ) -> list[int] | None:
+        """Return numbers of lines from start to end with a match of pattern.
+
+        The search runs inside Tcl, so no text is moved into Python.
+        Only literal patterns are searched, as Tcl's regular expressions
+        differ from Python's. Return None if pattern can not be searched
+        for exactly the same way in Tcl.
+        """
+        flags = pattern.flags & ~re.UNICODE
+        if flags & ~re.IGNORECASE:
+            return None
+        literal = align_engine.parse_literal(pattern.pattern)
+        if not literal or "\n" in literal:
+            # Matches spanning lines never match one line in Python
+            return None
+        options = ["-exact"]
+        if flags & re.IGNORECASE:
+            if not can_search_nocase(literal):
+                return None
+            options.append("-nocase")
+        try:
+            found = self.text.tk.call(
+                str(self.text),
+                "search",
+                "-all",
+                *options,
+                "--",
+                literal,
+                start,
+                end,
             )
-        return cast(
-            "AlignDialog",
-            engine._aligndialog,  # type: ignore[attr-defined,unused-ignore]
+        except TclError:
+            return None
+        indexes = self.text.tk.splitlist(found)
+        return sorted(
+            {utils.get_line_col(str(index))[0] for index in indexes},
+        )
+
+    def get_lines(self, line_numbers: Sequence[int]) -> list[str]:
+        """Return text of each line in line_numbers with one Tcl call."""
+        if not line_numbers:
+            return []
+        lines = self.text.tk.call(
+            "lmap",
+            "line",
+            tuple(line_numbers),
+            f"{self.text} get $line.0 {{$line.0 lineend}}",
         )
+        return [str(line) for line in self.text.tk.splitlist(lines)]
 
     @utils.log_exceptions
+    @utils.profile_calls
+    @utils.record_stats
     def align_selection(
         self,
         selection: tuple[str, str],
@@ -255,91 +833,561 @@ class idlealign(utils.BaseExtension):  # noqa: N801
 
         Return True if should close window.
         """
+        stats = utils.current_stats()
+
         # Get start and end from selection, both are strings of {line}.{col}
-        select_start, select_end = selection
+        select_start, select_end = map(utils.TextPosition.parse, selection)
 
         # Get full first line till one past end line from selection
-        select_start = utils.get_whole_line(select_start)
-        grab_end = utils.get_whole_line(select_end, 1)
+        select_start = select_start.line_start()
+        grab_end = select_end.line_start(1)
 
-        # Get the characters from full line selection
-        chars: str = self.text.get(select_start, grab_end)
+        first_line = select_start.line
 
-        # Split lines
-        lines = chars.splitlines()
-        # Keeping track of lines to modify
-        line_data: dict[int, tuple[str, str]] = {}
+        # Tab indented lines are aligned as spaces, tabs are put back after
+        codec = self.get_indent_codec()
 
-        # Finding min width excluding spaces of all lines till start of align pattern
-        sec_start = 0
-        for idx, line in enumerate(lines):
-            # Regular expression match
-            match = pattern.search(line)
+        # Nothing changed since this region was last seen aligned
+        changes = utils.get_change_counter(self.editwin)
+        key = (
+            first_line,
+            grab_end.line,
+            pattern,
+            space_wrap,
+            align_side,
+            codec.tab_width,
+        )
+        known = self.memo.get(key)
+        if known is not None and known[0] == changes.count:
+            stats.count("memo_hits", 1)
+            return False
 
-            if match is None:  # If align pattern not in line, skip line
-                continue
+        line_numbers: list[int] | None = None
+        if str(self.tcl_prefilter).lower() == "true":
+            with stats.phase("search"):
+                line_numbers = self.search_lines(
+                    pattern,
+                    str(select_start),
+                    str(grab_end),
+                )
+        if line_numbers is None:
+            # Get the characters from full line selection
+            with stats.phase("fetch"):
+                chars: str = self.text.get(str(select_start), str(grab_end))
+                # Only newlines separate lines in a text widget
+                old_lines = chars.removesuffix("\n").split("\n")
+            line_numbers = list(
+                range(first_line, first_line + len(old_lines)),
+            )
+        else:
+            # Only lines with a match cross over from Tcl
+            with stats.phase("fetch"):
+                old_lines = self.get_lines(line_numbers)
+        stats.count_chars("chars_from_tk", old_lines)
+        stats.count("lines_scanned", len(old_lines))
+
+        # Text changed, but maybe not in this region
+        digest = hash(tuple(old_lines))
+        if known is not None and known[1] == digest:
+            stats.count("memo_hits", 1)
+            self.memo.add(key, changes.count, digest)
+            return False
 
-            # Get the where alignment pattern starts and ends at
-            start, end = match.span()
+        tabbed = any(map(codec.uses_tabs, old_lines))
+        expanded = codec.expand(old_lines) if tabbed else old_lines
 
-            prefix = line[:start]
-            align = line[start:end]
-            suffix = line[end:]
+        with stats.phase("check"):
+            aligned = align_engine.is_aligned(
+                expanded,
+                pattern,
+                space_wrap,
+                align_side,
+            )
+        if aligned:
+            # No matches or nothing would change
+            self.memo.add(key, changes.count, digest)
+            return False
 
-            # If space wrap is set, wrap alignment text with spaces
-            if space_wrap:
-                align = f" {align} "
+        # Split lines and find width to align at
+        with stats.phase("match"):
+            line_data, width = align_engine.match_lines(
+                expanded,
+                pattern,
+                space_wrap,
+                align_side,
+            )
+        if not line_data:
+            # There are no lines with selected pattern
+            return False
 
-            if not align_side:  # If align to left side
-                # Strip trailing spaces before align but keep indent
-                prefix = prefix.rstrip()
-                suffix = align + suffix.strip()  # Strip extra spaces
-            else:  # If align to right side
-                prefix += align.lstrip()
-                suffix = suffix.lstrip()
+        with stats.phase("pad"):
+            padded = align_engine.pad_lines(expanded, line_data, width)
+            if padded is None:
+                # There was no change so stop
+                return False
+            lines = codec.restore(padded, old_lines) if tabbed else padded
+        with stats.phase("diff"):
+            edits: list[align_engine.LineEdit] = []
+            lines_before: list[str] = []
+            for edit in align_engine.get_line_edits(old_lines, lines):
+                edits.append(edit._replace(line=line_numbers[edit.line]))
+                lines_before.append(old_lines[edit.line])
+        stats.count("lines_changed", len(edits))
+        stats.count_chars("chars_to_tk", (edit.new for edit in edits))
+
+        # This is all one undo record, and realigning the same lines
+        # again is merged into it
+        with utils.batch_colorizer(self.editwin):
+            utils.add_line_edits(
+                self.undo,
+                edits,
+                lines_before,
+                ("align", first_line, grab_end.line),
+                tags,
+            )
+        # Patterns matching the spaces around them, like \s*=\s*, can
+        # change lines again on every pass, so check before remembering
+        with stats.phase("check"):
+            settled = align_engine.is_aligned(
+                padded,
+                pattern,
+                space_wrap,
+                align_side,
+            )
+        if settled:
+            self.memo.add(key, changes.count, hash(tuple(lines)))
 
-            line_data[idx] = (prefix, suffix)  # Remember after we get max
+        ## # Select modified area
+        ## utils.show_hit(self.text, select_start, grab_end)
+        return True
 
-            sec_start = max(sec_start, len(prefix))  # Update max
+    def get_bands(
+        self,
+        first_line: int,
+        last_line: int,
+        start_col: int,
+        end_col: int | None,
+    ) -> list[str]:
+        """Return text between two columns of each line with one Tcl call.
+
+        If end_col is None, bands run to the end of each line. Lines
+        shorter than start_col give empty strings.
+        """
+        end = "{$line.0 lineend}" if end_col is None else f"$line.{end_col}"
+        bands = self.text.tk.call(
+            "lmap",
+            "line",
+            tuple(range(first_line, last_line + 1)),
+            f"{self.text} get $line.{start_col} {end}",
+        )
+        return [str(band) for band in self.text.tk.splitlist(bands)]
 
-        if not line_data:
-            # There are no lines with selected pattern so stop
+    @utils.log_exceptions
+    @utils.profile_calls
+    @utils.record_stats
+    def align_rectangle(
+        self,
+        selection: tuple[str, str],
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        tags: str | list[str] | tuple[str, ...] = (),
+    ) -> bool:
+        """Align only the columns between selection start and end.
+
+        Selection start and end columns mark the left and right edges
+        of a rectangle over the selected lines. Only the text inside it
+        is fetched and replaced, text outside the band on either side is
+        never touched. Columns are character indexes, so tabs count as
+        one column. If selection ends at the start of a line, like when
+        dragging over whole lines, that line is left out and the band
+        runs to the end of each line. Return True if should close window.
+        """
+        stats = utils.current_stats()
+
+        first_line, first_col = utils.TextPosition.parse(selection[0])
+        last_line, last_col = utils.TextPosition.parse(selection[1])
+        end_col: int | None
+        if last_col == 0 and last_line > first_line:
+            last_line -= 1
+            start_col, end_col = first_col, None
+        else:
+            start_col, end_col = sorted((first_col, last_col))
+            if start_col == end_col:
+                return False
+
+        with stats.phase("fetch"):
+            bands = self.get_bands(first_line, last_line, start_col, end_col)
+        stats.count_chars("chars_from_tk", bands)
+        stats.count("lines_scanned", len(bands))
+
+        with stats.phase("match"):
+            edits = [
+                edit._replace(line=first_line + edit.line)
+                for edit in align_engine.align_band(
+                    bands,
+                    start_col,
+                    pattern,
+                    space_wrap,
+                    align_side,
+                )
+            ]
+        if not edits:
             return False
+        stats.count("lines_changed", len(edits))
+        stats.count_chars("chars_to_tk", (edit.new for edit in edits))
 
-        changed = False
-        # For each line selected that had align pattern, add or remove
-        # spaces from start up to pattern so each pattern starts in the same column
-        for key, value in line_data.items():
-            prefix, suffix = value
+        # Only band text is known, so this record is never merged
+        with utils.batch_colorizer(self.editwin):
+            utils.add_line_edits(self.undo, edits, None, None, tags)
+        return True
 
-            new = prefix.ljust(sec_start) + suffix
+    def replace_lines(
+        self,
+        changes: Sequence[tuple[int, Sequence[str]]],
+        tags: str | list[str] | tuple[str, ...] = (),
+        editwin: EditorWindow | None = None,
+    ) -> None:
+        """Replace lines as one undo record.
 
-            if lines[key] != new:
-                changed = True
-                lines[key] = new
+        Changes are (first_line, new_lines) tuples, each replacing
+        len(new_lines) lines starting at first_line. Changes must not
+        overlap. Only the changed part of each line is replaced, and
+        only that is kept in the undo history.
 
-        if not changed:
-            # There was no change so stop
+        If editwin is given, changes are made in that window instead.
+        """
+        if editwin is None:
+            editwin = self.editwin
+        edits: list[align_engine.LineEdit] = []
+        lines_before: list[str] = []
+        for first_line, new_lines in sorted(changes, key=lambda c: c[0]):
+            chars: str = editwin.text.get(
+                *utils.get_line_selection(first_line, len(new_lines)),
+            )
+            old_lines = chars.split("\n")[: len(new_lines)]
+            for edit in align_engine.get_line_edits(
+                old_lines,
+                new_lines,
+                first_line,
+            ):
+                edits.append(edit)
+                lines_before.append(old_lines[edit.line - first_line])
+        if not edits:
+            return
+        with utils.batch_colorizer(editwin):
+            utils.add_line_edits(
+                editwin.undo,
+                edits,
+                lines_before,
+                ("blocks", tuple((c[0], len(c[1])) for c in changes)),
+                tags,
+            )
+
+    @utils.log_exceptions
+    def align_regions(
+        self,
+        regions: Sequence[tuple[int, int]],
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        tags: str | list[str] | tuple[str, ...] = (),
+    ) -> bool:
+        """Align each region independently in one undo block.
+
+        Regions are (first_line, last_line) inclusive line number pairs.
+        Overlapping regions are merged. Return True if anything changed.
+        """
+        codec = self.get_indent_codec()
+        changes: list[tuple[int, Sequence[str]]] = []
+        for first_line, last_line in utils.merge_line_ranges(regions):
+            chars: str = self.text.get(
+                *utils.get_line_selection(
+                    first_line,
+                    last_line - first_line + 1,
+                ),
+            )
+            lines = align_engine.align_lines(
+                chars.removesuffix("\n").split("\n"),
+                pattern,
+                space_wrap,
+                align_side,
+                codec,
+            )
+            if lines is not None:
+                changes.append((first_line, lines))
+
+        if not changes:
             return False
+        self.replace_lines(changes, tags)
+        return True
 
-        # Add extra blank line because of how insert works
-        lines.append("")
-        # Re-get characters to set
-        chars = "\n".join(lines)
+    def align_tagged(
+        self,
+        tag: str,
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        tags: str | list[str] | tuple[str, ...] = (),
+    ) -> bool:
+        """Align every region tagged with tag. Return if anything changed."""
+        return self.align_regions(
+            utils.get_tag_line_ranges(self.text, tag),
+            pattern,
+            space_wrap,
+            align_side,
+            tags,
+        )
 
-        # This is all one operation
-        with utils.undo_block(self.undo):
-            # Replace old text with new aligned text
-            self.text.delete(select_start, grab_end)
-            self.text.insert(select_start, chars, tags)
+    @utils.log_exceptions
+    def align_blocks(
+        self,
+        selection: tuple[str, str],
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        tags: str | list[str] | tuple[str, ...] = (),
+    ) -> bool:
+        """Align each block of matching lines in selection independently.
 
-        ## # Select modified area
-        ## utils.show_hit(self.text, select_start, grab_end)
+        Blocks are runs of consecutive lines with the same indent that
+        all match pattern. If selection is empty, the whole file is
+        used. All changes are one undo block. Return if anything
+        changed.
+        """
+        select_start, select_end = map(utils.TextPosition.parse, selection)
+        if select_start == select_end:
+            first_line = 1
+            grab_end = utils.TextPosition.parse(self.text.index("end"))
+        else:
+            first_line = select_start.line
+            grab_end = select_end.line_start(1)
+
+        chars: str = self.text.get(f"{first_line}.0", str(grab_end))
+        lines = chars.removesuffix("\n").split("\n")
+
+        changes = align_engine.align_blocks(
+            lines,
+            align_engine.find_blocks(lines, pattern),
+            pattern,
+            space_wrap,
+            align_side,
+            self.get_indent_codec(),
+        )
+        if not changes:
+            return False
+        self.replace_lines(
+            [(first_line + start, new_lines) for start, new_lines in changes],
+            tags,
+        )
+        return True
+
+    @utils.log_exceptions
+    def align_changed_blocks(
+        self,
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        rev: str = "HEAD",
+    ) -> bool:
+        """Align blocks touching lines changed since git revision rev.
+
+        File must be saved first, asks user to save if it is not.
+        Return True if anything changed.
+        """
+        if not self.editwin.get_saved():
+            if not utils.ask_save_dialog(self.text):
+                return False
+            self.files.save(None)
+            if not self.editwin.get_saved():
+                return False
+        filename = self.files.filename
+        if filename is None:
+            return False
+
+        path = os.path.abspath(filename)
+        try:
+            changed = gitdiff.get_changed_lines(
+                [os.path.basename(path)],
+                rev,
+                cwd=os.path.dirname(path),
+            )
+        except (OSError, subprocess.CalledProcessError) as exc:
+            utils.extension_log_exception(exc)
+            return False
+        ranges = changed.get(os.path.basename(path))
+        if not ranges:
+            return False
+
+        chars: str = self.text.get("1.0", "end-1c")
+        lines = chars.split("\n")
+        changes = align_engine.align_blocks(
+            lines,
+            align_engine.expand_blocks(
+                lines,
+                [(first - 1, last - 1) for first, last in ranges],
+                pattern,
+            ),
+            pattern,
+            space_wrap,
+            align_side,
+            self.get_indent_codec(),
+        )
+        if not changes:
+            return False
+        self.replace_lines(
+            [(start + 1, new_lines) for start, new_lines in changes],
+        )
         return True
 
+    def get_open_editor_windows(self) -> list[EditorWindow]:
+        """Return all open editor windows, excluding the shell."""
+        shell = getattr(self.flist, "pyshell", None)
+        return [
+            editwin
+            for editwin in self.flist.inversedict
+            if editwin is not shell and editwin.text is not None
+        ]
+
+    @utils.log_exceptions
+    def align_open_files(
+        self,
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+    ) -> int:
+        """Align blocks of matching lines in every open editor window.
+
+        Text is fetched from each window on the Tk thread, alignment is
+        computed for all windows on a thread pool, and the resulting
+        edits are applied back on the Tk thread, one undo block per
+        window. Return number of windows that were changed.
+        """
+        windows = self.get_open_editor_windows()
+        if not windows:
+            return 0
+
+        def compute(
+            chars: str,
+            codec: align_engine.IndentCodec,
+        ) -> list[tuple[int, list[str]]]:
+            """Return changed blocks for text of a whole file."""
+            lines = chars.split("\n")
+            return align_engine.align_blocks(
+                lines,
+                align_engine.find_blocks(lines, pattern),
+                pattern,
+                space_wrap,
+                align_side,
+                codec,
+            )
+
+        changed = 0
+        workers = min(len(windows), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures: dict[Future[list[tuple[int, list[str]]]], EditorWindow]
+            futures = {}
+            for editwin in windows:
+                # Text has to be fetched on the Tk thread
+                chars: str = editwin.text.get("1.0", "end-1c")
+                codec = align_engine.IndentCodec(editwin.get_tk_tabwidth())
+                futures[executor.submit(compute, chars, codec)] = editwin
+            # Apply results on this (the Tk) thread as they finish
+            for future in as_completed(futures):
+                changes = future.result()
+                if not changes:
+                    continue
+                self.replace_lines(
+                    [(start + 1, new_lines) for start, new_lines in changes],
+                    editwin=futures[future],
+                )
+                changed += 1
+        return changed
+
     def align_selection_event(self, _event: Event[Any] | None) -> str:
         """Align selected text."""
         self.reload()
 
         self.window.open()
         return "break"
+
+    def toggle_virtual_align_event(self, _event: Event[Any] | None) -> str:
+        """Toggle display-only alignment of lines as they come into view.
+
+        Aligns on the delimiter detected in the lines on screen.
+        """
+        if self.virtual is not None:
+            self.virtual.stop()
+            self.virtual = None
+            return "break"
+        first = utils.get_line_col(self.text.index("@0,0"))[0]
+        last = utils.get_line_col(
+            self.text.index(f"@0,{self.text.winfo_height()}"),
+        )[0]
+        delimiter = self.detect_delimiter((f"{first}.0", f"{last}.0"))
+        if delimiter is None:
+            self.text.bell()
+            return "break"
+        self.virtual = VirtualAlignment(
+            self.text,
+            align_engine.compile_pattern(delimiter, "literal"),
+            utils.get_change_counter(self.editwin),
+            tab_width=self.editwin.get_tk_tabwidth(),
+        )
+        self.virtual.start()
+        return "break"
+
+    def close(self) -> None:
+        """Release resources when editor window closes."""
+        if self.virtual is not None:
+            self.virtual.stop()
+            self.virtual = None
+        self.close_window()
+        utils.remove_change_counter(self.editwin)
+
+    def align_stats_event(self, _event: Event[Any] | None) -> str:
+        """Show summary of recorded alignment timings and save them as JSON."""
+        self.reload()
+        summary = utils.summarize_stats()
+        if not utils.STATS_ENABLED:
+            summary = (
+                "Statistics are disabled, set record_stats = True in the "
+                f"{self.__class__.__name__} extension settings to record "
+                f"them.\n\n{summary}"
+            )
+        elif utils.STATS:
+            stats_file = utils.write_stats()
+            summary += f"\n\nSaved to {stats_file}"
+        messagebox.showinfo(
+            title="Align Stats",
+            message=summary,
+            parent=self.text,
+        )
+        return "break"
+
+    @utils.log_exceptions
+    def align_preset(self, name: str) -> bool:
+        """Align selected text using preset. Return if text changed."""
+        preset = self.presets.get(name)
+        if preset is None:
+            return False
+        return self.align_selection(
+            utils.get_selected_text_indexes(self.text),
+            preset.pattern,
+            preset.space_wrap,
+            preset.align_side,
+        )
+
+    def get_preset_event_handler(
+        self,
+        name: str,
+    ) -> Callable[[Event[Any] | None], str]:
+        """Return event handler that aligns selected text using preset."""
+
+        def align_preset_event(_event: Event[Any] | None) -> str:
+            """Align selected text using preset without opening dialog."""
+            if not self.align_preset(name):
+                self.text.bell()
+            return "break"
+
+        return align_preset_event
@@ -0,0 +1,158 @@
+"""Git Diff - Find lines changed in a git working tree."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "gitdiff"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import re
+import subprocess
+from typing import TYPE_CHECKING, Final
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+HUNK_HEADER: Final = re.compile(
+    r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@",
+)
+
+# Escapes git uses in C-quoted paths, other than octal bytes
+C_ESCAPES: Final = {
+    "a": 0x07,
+    "b": 0x08,
+    "t": 0x09,
+    "n": 0x0A,
+    "v": 0x0B,
+    "f": 0x0C,
+    "r": 0x0D,
+    '"': 0x22,
+    "\\": 0x5C,
+}
+
+
+def unquote_path(path: str) -> str:
+    """Return path from diff header with git's quoting undone.
+
+    Paths with unusual characters are wrapped in double quotes with C
+    style escapes, where non-ASCII bytes are octal escapes of their
+    UTF-8 encoding. Paths with spaces get a trailing tab instead.
+    """
+    path = path.removesuffix("\t")
+    if len(path) < 2 or not path.startswith('"') or not path.endswith('"'):
+        return path
+    data = bytearray()
+    chars = iter(path[1:-1])
+    for char in chars:
+        if char != "\\":
+            data.extend(char.encode("utf-8"))
+            continue
+        char = next(chars, "\\")
+        if char in C_ESCAPES:
+            data.append(C_ESCAPES[char])
+        elif char in "01234567":
+            digits = char + next(chars, "") + next(chars, "")
+            data.append(int(digits, 8))
+        else:
+            data.extend(("\\" + char).encode("utf-8"))
+    return data.decode("utf-8", errors="replace")
+
+
+def parse_diff(diff: str) -> dict[str, list[tuple[int, int]]]:
+    """Return changed line ranges per file from unified diff text.
+
+    Diff is expected without a/ and b/ path prefixes, as from
+    `git diff --no-prefix`. Ranges are inclusive (first, last) line
+    numbers in the new version of each file, starting at 1. A pure
+    deletion becomes the two lines on either side of where lines were
+    removed. Quoted paths are unquoted with unquote_path.
+    """
+    changed: dict[str, list[tuple[int, int]]] = {}
+    ranges: list[tuple[int, int]] | None = None
+    # Lines left in the current hunk, from its header
+    old_left = new_left = 0
+    for line in diff.split("\n"):
+        if old_left > 0 or new_left > 0:
+            # Hunk lines can look like headers, so only count them
+            if line.startswith("-"):
+                old_left -= 1
+            elif line.startswith("+"):
+                new_left -= 1
+            elif line.startswith(" "):
+                old_left -= 1
+                new_left -= 1
+            continue
+        if line.startswith("+++ "):
+            path = unquote_path(line[4:])
+            if path == "/dev/null":
+                ranges = None
+            else:
+                ranges = changed.setdefault(path, [])
+            continue
+        match = HUNK_HEADER.match(line)
+        if match is None:
+            continue
+        old_left = 1 if match.group(1) is None else int(match.group(1))
+        start = int(match.group(2))
+        count = 1 if match.group(3) is None else int(match.group(3))
+        new_left = count
+        if ranges is None:
+            continue
+        if count == 0:
+            ranges.append((max(1, start), start + 1))
+        else:
+            ranges.append((start, start + count - 1))
+    return changed
+
+
+def get_changed_lines(
+    paths: Iterable[str] = (),
+    rev: str = "HEAD",
+    cwd: str | Path | None = None,
+) -> dict[str, list[tuple[int, int]]]:
+    """Return changed line ranges per file compared to rev.
+
+    Runs `git diff` in cwd, so returned paths are relative to cwd.
+    Raises subprocess.CalledProcessError if git fails and OSError if
+    git cannot be run.
+    """
+    command = [
+        "git",
+        "diff",
+        "--no-color",
+        "--no-ext-diff",
+        "--relative",
+        "--no-prefix",
+        "--unified=0",
+        rev,
+        "--",
+        *paths,
+    ]
+    result = subprocess.run(  # noqa: S603
+        command,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        check=True,
+    )
+    return parse_diff(result.stdout)
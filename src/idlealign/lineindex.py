@@ -0,0 +1,306 @@
+"""Line Index - Random access to lines of huge files through mmap."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "lineindex"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Final, overload
+
+from idlealign import engine
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from re import Pattern
+    from types import TracebackType
+    from typing import BinaryIO
+
+    from typing_extensions import Self
+
+# Bytes copied at a time between changed blocks
+COPY_CHUNK_SIZE: Final = 1024 * 1024
+
+
+class LineIndex(Sequence[str]):
+    """Lines of a memory mapped UTF-8 file, decoded only when asked for.
+
+    The start offset of every line is found in one scan and kept in a
+    compact array, so any line can be read without decoding the rest
+    of the file. Lines are returned without their line ending, which
+    is either a newline or a carriage return and newline.
+
+    Use as a context manager, or call close when done.
+    """
+
+    __slots__ = ("file", "map", "size", "starts")
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """Memory map file at path and index its lines."""
+        self.file = open(path, "rb")  # noqa: SIM115  # closed in close
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map: mmap.mmap | None = None
+        if self.size:
+            self.map = mmap.mmap(
+                self.file.fileno(),
+                0,
+                access=mmap.ACCESS_READ,
+            )
+        # Offset each line starts at, the first always starts at zero
+        self.starts = array("Q", [0])
+        if self.map is not None:
+            position = self.map.find(b"\n")
+            while position >= 0:
+                self.starts.append(position + 1)
+                position = self.map.find(b"\n", position + 1)
+
+    def close(self) -> None:
+        """Unmap and close file."""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self) -> Self:
+        """Return self."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close file."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Return number of lines, counting the one after a final newline."""
+        return len(self.starts)
+
+    def get_span(self, index: int) -> tuple[int, int]:
+        """Return (start, end) byte offsets of line without line ending."""
+        start = self.starts[index]
+        if index + 1 < len(self.starts):
+            end = self.starts[index + 1] - 1
+        else:
+            end = self.size
+        if end > start and self.map is not None and self.map[end - 1] == 13:
+            # Carriage return
+            end -= 1
+        return start, end
+
+    def has_carriage_return(self, index: int) -> bool:
+        """Return if line at index ends with a carriage return."""
+        end = self.get_span(index)[1]
+        return end < self.size and self.map is not None and self.map[end] == 13
+
+    def get_line(self, index: int) -> str:
+        """Return decoded line at index without its line ending."""
+        if self.map is None:
+            return ""
+        start, end = self.get_span(index)
+        return self.map[start:end].decode("utf-8")
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        """Return decoded line or list of lines."""
+        if isinstance(index, slice):
+            indexes = range(len(self))[index]
+            if indexes.step != 1 or not indexes:
+                return [self.get_line(idx) for idx in indexes]
+            return self.get_lines(indexes.start, indexes.stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return self.get_line(index)
+
+    def get_lines(self, start: int, end: int) -> list[str]:
+        """Return decoded lines from start to end index, decoded at once."""
+        if self.map is None:
+            return [""] * (end - start)
+        first = self.get_span(start)[0]
+        last = self.get_span(end - 1)[1]
+        return [
+            line.removesuffix("\r")
+            for line in self.map[first:last].decode("utf-8").split("\n")
+        ]
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield each decoded line in order."""
+        if self.map is None:
+            yield ""
+            return
+        self.map.seek(0)
+        line = b""
+        for line in iter(self.map.readline, b""):
+            yield line.removesuffix(b"\n").removesuffix(b"\r").decode("utf-8")
+        if line.endswith(b"\n"):
+            # Empty line after final newline
+            yield ""
+
+    def copy_bytes(self, output: BinaryIO, start: int, end: int) -> None:
+        """Write bytes from start to end offset to output in chunks."""
+        if self.map is None:
+            return
+        while start < end:
+            stop = min(end, start + COPY_CHUNK_SIZE)
+            output.write(self.map[start:stop])
+            start = stop
+
+
+def get_blocks(
+    lines: LineIndex,
+    pattern: Pattern[str],
+    line_ranges: Iterable[tuple[int, int]] | None = None,
+) -> list[tuple[int, int]]:
+    """Return blocks of lines to align, scanning lines one at a time.
+
+    See engine.find_blocks and engine.expand_blocks.
+    """
+    if line_ranges is None:
+        return engine.find_blocks(lines, pattern)
+    return engine.expand_blocks(lines, line_ranges, pattern)
+
+
+def iter_changes(
+    lines: LineIndex,
+    blocks: Iterable[tuple[int, int]],
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+) -> Iterator[tuple[int, list[str]]]:
+    """Yield (start, new_lines) of each block that changes when aligned.
+
+    Only the lines of one block are decoded at a time.
+    """
+    for start, end in blocks:
+        new_lines = engine.align_lines(
+            lines[start:end],
+            pattern,
+            space_wrap,
+            align_side,
+        )
+        if new_lines is not None:
+            yield start, new_lines
+
+
+def write_changes(
+    lines: LineIndex,
+    changes: Iterable[tuple[int, Sequence[str]]],
+    output: BinaryIO,
+) -> bool:
+    """Write lines with changed blocks replaced to output.
+
+    Changes must be in order and not overlap. Bytes between changed
+    blocks are copied over as they are, so only changed blocks are
+    encoded. Line endings are kept. Return if there were any changes.
+    """
+    changed = False
+    position = 0
+    for start, new_lines in changes:
+        changed = True
+        last = start + len(new_lines) - 1
+        lines.copy_bytes(output, position, lines.get_span(start)[0])
+        output.write(
+            "\n".join(
+                f"{new}\r"
+                if idx != last and lines.has_carriage_return(idx)
+                else new
+                for idx, new in enumerate(new_lines, start)
+            ).encode("utf-8"),
+        )
+        # Line ending of last line is copied with the rest
+        position = lines.get_span(last)[1]
+    lines.copy_bytes(output, position, lines.size)
+    return changed
+
+
+def align_file(
+    path: str,
+    pattern: Pattern[str],
+    space_wrap: bool = True,
+    align_side: bool = False,
+    write: bool = False,
+    line_ranges: Iterable[tuple[int, int]] | None = None,
+) -> bool:
+    """Align blocks of file at path, return if anything changed.
+
+    Unlike engine.align_text, the file is never read into memory as a
+    whole. Lines are decoded one at a time to find blocks, and if write
+    is set, changed blocks are written out as they are aligned. Memory
+    used stays about the same no matter how big the file is, apart
+    from eight bytes of index per line. If write is not set, this stops
+    at the first block that would change.
+
+    Raises OSError if file can not be read or written and
+    UnicodeDecodeError if it is not UTF-8.
+    """
+    with LineIndex(path) as lines:
+        blocks = get_blocks(lines, pattern, line_ranges)
+        if not write:
+            return not all(
+                engine.is_aligned(
+                    lines[start:end],
+                    pattern,
+                    space_wrap,
+                    align_side,
+                )
+                for start, end in blocks
+            )
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                changed = write_changes(
+                    lines,
+                    iter_changes(
+                        lines,
+                        blocks,
+                        pattern,
+                        space_wrap,
+                        align_side,
+                    ),
+                    output,
+                )
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    # File has to be closed before it can be replaced on Windows
+    if not changed:
+        os.unlink(temp_path)
+        return False
+    shutil.copymode(path, temp_path)
+    os.replace(temp_path, path)
+    return True
@@ -0,0 +1,108 @@
+"""Profiling - Record CPU profiles and allocation snapshots of runs."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "profiling"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import TracebackType
+
+    from typing_extensions import Self
+
+# Only one profiler can be active at a time
+_ACTIVE_LOCK = threading.Lock()
+
+
+class Profile:
+    """Context manager profiling the code run inside it.
+
+    On exit, cProfile statistics are written to a .pstats file and a
+    tracemalloc snapshot to a .tracemalloc file in directory, both named
+    after name and the time profiling started. Load them with
+    pstats.Stats and tracemalloc.Snapshot.load.
+
+    If another Profile is already running, this one does nothing and
+    stats_path and snapshot_path stay None.
+    """
+
+    __slots__ = (
+        "active",
+        "directory",
+        "name",
+        "profiler",
+        "snapshot_path",
+        "started_tracing",
+        "stats_path",
+    )
+
+    def __init__(self, directory: Path, name: str) -> None:
+        """Initialize profile writing into directory."""
+        self.directory = directory
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.active = False
+        self.started_tracing = False
+        self.stats_path: Path | None = None
+        self.snapshot_path: Path | None = None
+
+    def __enter__(self) -> Self:
+        """Start profiling unless already profiling."""
+        self.active = _ACTIVE_LOCK.acquire(blocking=False)
+        if not self.active:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.profiler.enable()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Stop profiling and write results."""
+        if not self.active:
+            return
+        try:
+            self.profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            if self.started_tracing:
+                tracemalloc.stop()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            base = f"{self.name}-{stamp}"
+            self.stats_path = self.directory / f"{base}.pstats"
+            self.snapshot_path = self.directory / f"{base}.tracemalloc"
+            self.profiler.dump_stats(self.stats_path)
+            snapshot.dump(str(self.snapshot_path))
+        finally:
+            self.active = False
+            _ACTIVE_LOCK.release()
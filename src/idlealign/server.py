@@ -0,0 +1,318 @@
+"""Server - Alignment as a JSON-RPC service over standard streams."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "server"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Final
+
+from idlealign import engine
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+    from re import Pattern
+    from typing import IO
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR: Final = -32700
+INVALID_REQUEST: Final = -32600
+METHOD_NOT_FOUND: Final = -32601
+INVALID_PARAMS: Final = -32602
+INTERNAL_ERROR: Final = -32603
+
+# Number of split documents kept between requests
+DOCUMENT_CACHE_SIZE: Final = 32
+
+
+class RPCError(Exception):
+    """JSON-RPC error to report back to the client."""
+
+    __slots__ = ("code",)
+
+    def __init__(self, code: int, message: str) -> None:
+        """Initialize with JSON-RPC error code and message."""
+        super().__init__(message)
+        self.code = code
+
+
+@lru_cache(maxsize=256)
+def get_pattern(pattern: str, mode: str = "regex") -> Pattern[str]:
+    """Return compiled pattern, cached between requests."""
+    return engine.compile_pattern(pattern, mode)
+
+
+class DocumentCache:
+    """Thread-safe LRU cache of documents split into lines.
+
+    Documents are keyed by client supplied uri and version, so a
+    client can send a document once and refer to it afterwards.
+    """
+
+    __slots__ = ("documents", "lock", "size")
+
+    def __init__(self, size: int = DOCUMENT_CACHE_SIZE) -> None:
+        """Initialize empty cache holding at most size documents."""
+        self.size = size
+        self.lock = threading.Lock()
+        self.documents: OrderedDict[tuple[str, int], list[str]] = OrderedDict()
+
+    def get(self, uri: str, version: int) -> list[str] | None:
+        """Return cached lines of document or None."""
+        with self.lock:
+            lines = self.documents.get((uri, version))
+            if lines is not None:
+                self.documents.move_to_end((uri, version))
+            return lines
+
+    def put(self, uri: str, version: int, lines: list[str]) -> None:
+        """Remember lines of document, dropping older versions of it."""
+        with self.lock:
+            for key in [key for key in self.documents if key[0] == uri]:
+                del self.documents[key]
+            self.documents[(uri, version)] = lines
+            while len(self.documents) > self.size:
+                self.documents.popitem(last=False)
+
+
+def get_param(
+    params: dict[str, Any],
+    name: str,
+    type_: type[Any],
+    default: Any = None,
+) -> Any:
+    """Return parameter checked against type. Raises RPCError if invalid."""
+    if name not in params:
+        if default is None:
+            raise RPCError(INVALID_PARAMS, f"Missing parameter {name!r}")
+        return default
+    value = params[name]
+    # bool is a subclass of int, but not a valid line number
+    if not isinstance(value, type_) or (
+        type_ is int and isinstance(value, bool)
+    ):
+        raise RPCError(
+            INVALID_PARAMS,
+            f"Parameter {name!r} should be of type {type_.__name__}",
+        )
+    return value
+
+
+def format_changes(
+    changes: Sequence[tuple[int, Sequence[str]]],
+) -> dict[str, Any]:
+    """Return result object for a list of (start, new_lines) changes."""
+    return {
+        "changed": bool(changes),
+        "edits": [
+            {"start": start, "lines": list(new_lines)}
+            for start, new_lines in changes
+        ],
+    }
+
+
+class AlignServer:
+    """JSON-RPC alignment server.
+
+    Requests and responses are JSON-RPC 2.0 objects, one per line.
+    Requests are handled concurrently, so responses can arrive out of
+    order and should be matched up by id.
+    """
+
+    __slots__ = ("documents", "methods", "running", "write_lock")
+
+    def __init__(self) -> None:
+        """Initialize server."""
+        self.documents = DocumentCache()
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.methods: dict[str, Callable[[dict[str, Any]], Any]] = {
+            "align_range": self.align_range,
+            "align_document": self.align_document,
+            "detect_delimiter": self.detect_delimiter,
+            "shutdown": self.shutdown,
+        }
+
+    def get_lines(self, params: dict[str, Any]) -> list[str]:
+        """Return document lines from text or cached uri and version."""
+        uri = params.get("uri")
+        version = params.get("version", 0)
+        if isinstance(uri, str) and isinstance(version, int):
+            lines = self.documents.get(uri, version)
+            if lines is not None and "text" not in params:
+                return lines
+        text: str = get_param(params, "text", str)
+        # Same line breaks as align_text, so line indexes agree with it
+        lines = [line.removesuffix("\r") for line in text.split("\n")]
+        if isinstance(uri, str) and isinstance(version, int):
+            self.documents.put(uri, version, lines)
+        return lines
+
+    def get_pattern(self, params: dict[str, Any]) -> Pattern[str]:
+        """Return compiled pattern from parameters."""
+        pattern: str = get_param(params, "pattern", str)
+        mode: str = get_param(params, "mode", str, "regex")
+        try:
+            return get_pattern(pattern, mode)
+        except (ValueError, re.error) as exc:
+            raise RPCError(INVALID_PARAMS, str(exc)) from exc
+
+    def align_range(self, params: dict[str, Any]) -> dict[str, Any]:
+        """Align lines start to end inclusive as one selection."""
+        lines = self.get_lines(params)
+        start: int = get_param(params, "start", int, 0)
+        end: int = get_param(params, "end", int, len(lines) - 1)
+        start = max(0, start)
+        new_lines = engine.align_lines(
+            lines[start : end + 1],
+            self.get_pattern(params),
+            get_param(params, "space_wrap", bool, True),
+            get_param(params, "align_side", bool, False),
+        )
+        if new_lines is None:
+            return format_changes([])
+        return format_changes([(start, new_lines)])
+
+    def align_document(self, params: dict[str, Any]) -> dict[str, Any]:
+        """Align each block of matching lines in document independently."""
+        lines = self.get_lines(params)
+        pattern = self.get_pattern(params)
+        return format_changes(
+            engine.align_blocks(
+                lines,
+                engine.find_blocks(lines, pattern),
+                pattern,
+                get_param(params, "space_wrap", bool, True),
+                get_param(params, "align_side", bool, False),
+            ),
+        )
+
+    def detect_delimiter(self, params: dict[str, Any]) -> dict[str, Any]:
+        """Detect most likely alignment delimiter in sampled lines."""
+        lines = self.get_lines(params)
+        start: int = get_param(params, "start", int, 0)
+        end: int = get_param(params, "end", int, len(lines) - 1)
+        sample = [
+            lines[index]
+            for index in engine.sample_line_numbers(
+                max(0, start),
+                min(end, len(lines) - 1),
+            )
+        ]
+        return {"delimiter": engine.detect_delimiter(sample)}
+
+    def shutdown(self, _params: dict[str, Any]) -> None:
+        """Stop reading requests after this one."""
+        self.running = False
+
+    def handle(self, request: Any) -> dict[str, Any] | None:
+        """Handle one decoded request. Return response or None.
+
+        Notifications (requests without an id) get no response, not
+        even when they fail.
+        """
+        response = self.get_response(request)
+        if isinstance(request, dict) and "id" not in request:
+            return None
+        return response
+
+    def get_response(self, request: Any) -> dict[str, Any]:
+        """Return response to one decoded request."""
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if (
+                not isinstance(request, dict)
+                or request.get("jsonrpc") != "2.0"
+                or not isinstance(request.get("method"), str)
+            ):
+                raise RPCError(INVALID_REQUEST, "Invalid request")
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RPCError(
+                    METHOD_NOT_FOUND,
+                    f"Method {request['method']!r} not found",
+                )
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, "Params should be an object")
+            result = method(params)
+        except RPCError as exc:
+            error = {"code": exc.code, "message": str(exc)}
+            return {"jsonrpc": "2.0", "id": request_id, "error": error}
+        except Exception as exc:  # noqa: BLE001  # reported to client
+            error = {"code": INTERNAL_ERROR, "message": repr(exc)}
+            return {"jsonrpc": "2.0", "id": request_id, "error": error}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def respond(
+        self,
+        response: dict[str, Any] | None,
+        output: IO[str],
+    ) -> None:
+        """Write response line to output unless response is None."""
+        if response is None:
+            return
+        data = json.dumps(response, separators=(",", ":"))
+        with self.write_lock:
+            output.write(data + "\n")
+            output.flush()
+
+    def handle_and_respond(self, request: Any, output: IO[str]) -> None:
+        """Handle one decoded request and write the response."""
+        self.respond(self.handle(request), output)
+
+    def serve(
+        self,
+        input_: IO[str],
+        output: IO[str],
+        workers: int | None = None,
+    ) -> None:
+        """Serve requests from input until it closes or shutdown is called."""
+        self.running = True
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for line in input_:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as exc:
+                    error = {"code": PARSE_ERROR, "message": str(exc)}
+                    self.respond(
+                        {"jsonrpc": "2.0", "id": None, "error": error},
+                        output,
+                    )
+                    continue
+                if isinstance(request, dict) and (
+                    request.get("method") == "shutdown"
+                ):
+                    # Handled in order so nothing after it is read
+                    self.handle_and_respond(request, output)
+                else:
+                    executor.submit(self.handle_and_respond, request, output)
+                if not self.running:
+                    break
+        self.running = False
@@ -24,21 +24,57 @@ __title__ = "extension-utils"
 __author__ = "CoolCat467"
 __license__ = "GNU General Public License Version 3"
 
+import atexit
 import importlib
+import json
+import queue
 import sys
+import threading
 import time
 import traceback
-from contextlib import contextmanager
-from functools import wraps
+import weakref
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import partial, total_ordering, wraps
 from idlelib import search, searchengine
 from idlelib.config import idleConf
+from idlelib.delegator import Delegator
+from idlelib.undo import Command
 from os.path import abspath
 from pathlib import Path
-from tkinter import TclError, Text, Tk, messagebox
-from typing import TYPE_CHECKING, ClassVar, Literal, NamedTuple, TypeVar
+from tkinter import BooleanVar, StringVar, TclError, Text, Tk, messagebox
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Final,
+    Literal,
+    NamedTuple,
+    TypeVar,
+    cast,
+)
+
+from idlealign import config
+from idlealign.engine import (
+    IndentCodec,
+    LineEdit,
+    apply_line_edit,
+    get_line_edit,
+    revert_line_edit,
+)
+from idlealign.profiling import Profile
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Generator, Iterable, Sequence
+    from collections.abc import (
+        Callable,
+        Generator,
+        Hashable,
+        Iterable,
+        Iterator,
+        Sequence,
+    )
+    from contextlib import AbstractContextManager
+    from idlelib.colorizer import ColorDelegator
     from idlelib.editor import EditorWindow
     from idlelib.format import FormatRegion
     from idlelib.iomenu import IOBinding
@@ -95,20 +131,6 @@ def check_installed(
     cls: type[BaseExtension] | None = None,
 ) -> bool:
     """Make sure extension installed. Return True if installed correctly."""
-    # Get list of system extensions
-    extensions = set(idleConf.defaultCfg["extensions"])
-
-    # Do we have the user extend extension?
-    has_user = "idleuserextend" in idleConf.GetExtensions(active_only=True)
-
-    # If we don't, things get messy and we need to change the root config file
-    ex_defaults = idleConf.defaultCfg["extensions"].file
-    if has_user:
-        # Otherwise, idleuserextend patches IDLE and we only need to modify
-        # the user config file
-        ex_defaults = idleConf.userCfg["extensions"].file
-        extensions |= set(idleConf.userCfg["extensions"])
-
     if cls is None:
         # Import extension
         module = importlib.import_module(extension)
@@ -127,32 +149,81 @@ def check_installed(
     # if not issubclass(cls, BaseExtension):
     #     raise ValueError(f"Expected BaseExtension subclass, got {cls!r}")
 
-    # If this extension not in there,
-    if extension not in extensions:
-        # Get extension class keybinding defaults
-        required_config = get_required_config(
+    return config.check_installed(
+        extension,
+        version,
+        partial(
+            get_required_config,
             getattr(cls, "values", {}),
             getattr(cls, "bind_defaults", {}),
             extension,
-        )
+        ),
+    )
 
-        # Tell user how to add it to system list.
-        print(f"{extension} not in system registered extensions!")
-        print(
-            f"Please run the following command to add {extension} "
-            + "to system extensions list.\n",
-        )
-        # Make sure line-breaks will go properly in terminal
-        add_data = required_config.replace("\n", "\\n")
-        # Tell them the command
-        append = "| sudo tee -a"
-        if has_user:
-            append = ">>"
-        print(f"echo -e '{add_data}' {append} {ex_defaults}\n")
-    else:
-        print(f"Configuration should be good! (v{version})")
-        return True
-    return False
+
+@total_ordering
+class TextPosition:
+    """Position in a text widget as integer line and column.
+
+    Lines start at one and columns at zero, like Tk. Positions compare
+    and sort like (line, col) tuples and unpack into them. str gives
+    the {line}.{col} index string Tk wants, so positions only need to
+    become strings when they are passed to Tk.
+    """
+
+    __slots__ = ("col", "line")
+
+    def __init__(self, line: int, col: int = 0) -> None:
+        """Initialize position."""
+        self.line = line
+        self.col = col
+
+    @classmethod
+    def parse(cls, index: str) -> Self:
+        """Return position from normalized {line}.{col} index string."""
+        line, col = index.split(".", 1)  # Fails on invalid index
+        return cls(int(line), int(col))
+
+    def __str__(self) -> str:
+        """Return Tk index string."""
+        return f"{self.line}.{self.col}"
+
+    def __repr__(self) -> str:
+        """Return representation of self."""
+        return f"{self.__class__.__name__}({self.line}, {self.col})"
+
+    def __iter__(self) -> Iterator[int]:
+        """Yield line and column."""
+        yield self.line
+        yield self.col
+
+    def __eq__(self, other: object) -> bool:
+        """Return if other is the same position."""
+        if not isinstance(other, TextPosition):
+            return NotImplemented
+        return self.line == other.line and self.col == other.col
+
+    def __lt__(self, other: object) -> bool:
+        """Return if self is before other."""
+        if not isinstance(other, TextPosition):
+            return NotImplemented
+        return (self.line, self.col) < (other.line, other.col)
+
+    def __hash__(self) -> int:
+        """Return hash of line and column."""
+        return hash((self.line, self.col))
+
+    def line_start(self, offset: int = 0) -> TextPosition:
+        """Return start of line offset lines after this one."""
+        return TextPosition(self.line + offset, 0)
+
+
+def get_line_span(
+    line: int,
+    length: int = 1,
+) -> tuple[TextPosition, TextPosition]:
+    """Return start of line and start of the line length lines after it."""
+    return TextPosition(line), TextPosition(line + length)
 
 
 def get_line_selection(line: int, length: int = 1) -> tuple[str, str]:
@@ -183,6 +254,61 @@ def get_selected_text_indexes(text: Text) -> tuple[str, str]:
     return first, last
 
 
+def get_selected_positions(text: Text) -> tuple[TextPosition, TextPosition]:
+    """Return positions of selection, or insert mark if nothing selected."""
+    first, last = get_selected_text_indexes(text)
+    return TextPosition.parse(first), TextPosition.parse(last)
+
+
+def merge_line_ranges(
+    ranges: Iterable[tuple[int, int]],
+) -> list[tuple[int, int]]:
+    """Return sorted inclusive (first, last) line ranges with overlaps merged."""
+    merged: list[tuple[int, int]] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def get_pointer_line(spans: Iterable[tuple[int, int]], start: int = 0) -> str:
+    """Return line with a caret under every column covered by spans.
+
+    Spans are inclusive (first, last) column ranges and may overlap.
+    The returned line starts just after column start, columns up to and
+    including start get no caret. Work depends on the number of spans,
+    not how many columns they cover.
+    """
+    parts: list[str] = []
+    position = start
+    for first, last in merge_line_ranges(spans):
+        first = max(first, position + 1)
+        if first > last:
+            continue
+        parts.append(" " * (first - position - 1))
+        parts.append("^" * (last - first + 1))
+        position = last
+    return "".join(parts)
+
+
+def get_tag_line_ranges(text: Text, tag: str) -> list[tuple[int, int]]:
+    """Return inclusive (first, last) line ranges covered by tag.
+
+    A range ending at column zero does not include that last line.
+    """
+    indexes = [str(index) for index in text.tag_ranges(tag)]
+    ranges: list[tuple[int, int]] = []
+    for start, end in zip(indexes[::2], indexes[1::2], strict=True):
+        first = TextPosition.parse(start).line
+        last, end_col = TextPosition.parse(end)
+        if end_col == 0 and last > first:
+            last -= 1
+        ranges.append((first, last))
+    return merge_line_ranges(ranges)
+
+
 def hide_hit(text: Text) -> None:
     """Remove `hit` tag from entire file."""
     text.tag_remove("hit", "1.0", "end")
@@ -305,24 +431,73 @@ def ask_save_dialog(parent: Text) -> bool:
     return confirm
 
 
+# Search engine parameters, each stored in engine.{name}var
+SEARCH_ENGINE_PARAMS: Final = ("pat", "re", "case", "word", "wrap", "back")
+
+
+class SearchEngineParams:
+    """Mirror of search engine parameters kept in sync by variable traces.
+
+    Reading parameters is a dictionary copy instead of a Tcl call per
+    variable, and only variables whose value differs are written.
+    """
+
+    __slots__ = ("engine", "values")
+
+    def __init__(self, engine: searchengine.SearchEngine) -> None:
+        """Initialize mirror and start tracing engine variables."""
+        self.engine = engine
+        self.values: dict[str, str | bool] = {}
+        for name in SEARCH_ENGINE_PARAMS:
+            var: StringVar | BooleanVar = getattr(engine, f"{name}var")
+            self.values[name] = var.get()
+            var.trace_add("write", partial(self.update, name))
+
+    def update(self, name: str, *_args: object) -> None:
+        """Update mirrored value after variable was written."""
+        self.values[name] = getattr(self.engine, f"{name}var").get()
+
+    def get(self) -> dict[str, str | bool]:
+        """Return copy of current parameters."""
+        return dict(self.values)
+
+    def set(self, data: dict[str, str | bool]) -> None:
+        """Set parameters in data that differ from current values."""
+        for name in SEARCH_ENGINE_PARAMS:
+            if name in data and self.values[name] != data[name]:
+                getattr(self.engine, f"{name}var").set(data[name])
+
+
+_SEARCH_ENGINE_PARAMS: weakref.WeakKeyDictionary[
+    searchengine.SearchEngine,
+    SearchEngineParams,
+] = weakref.WeakKeyDictionary()
+
+
+def get_search_engine_mirror(
+    engine: searchengine.SearchEngine,
+) -> SearchEngineParams:
+    """Return parameter mirror of search engine, creating it if needed."""
+    mirror = _SEARCH_ENGINE_PARAMS.get(engine)
+    if mirror is None:
+        mirror = SearchEngineParams(engine)
+        _SEARCH_ENGINE_PARAMS[engine] = mirror
+    return mirror
+
+
 def get_search_engine_params(
     engine: searchengine.SearchEngine,
 ) -> dict[str, str | bool]:
     """Get current search engine parameters."""
-    return {
-        name: getattr(engine, f"{name}var").get()
-        for name in ("pat", "re", "case", "word", "wrap", "back")
-    }
+    return get_search_engine_mirror(engine).get()
 
 
 def set_search_engine_params(
     engine: searchengine.SearchEngine,
     data: dict[str, str | bool],
 ) -> None:
-    """Get current search engine parameters."""
-    for name in ("pat", "re", "case", "word", "wrap", "back"):
-        if name in data:
-            getattr(engine, f"{name}var").set(data[name])
+    """Set search engine parameters that differ from current ones."""
+    get_search_engine_mirror(engine).set(data)
 
 
 @contextmanager
@@ -344,7 +519,249 @@ def undo_block(undo: UndoDelegator) -> Generator[None, None, None]:
     try:
         yield None
     finally:
-        undo.undo_block_stop()
+        with current_stats().phase("undo"):
+            undo.undo_block_stop()
+
+
+@contextmanager
+def batch_colorizer(editwin: EditorWindow) -> Generator[None, None, None]:
+    """Notify syntax colorizer of edits made in with block only once.
+
+    Normally the colorizer marks text to recolor on every insert and
+    delete. Inside this block edits skip that, and on exit the union
+    of lines that could have changed is marked all at once.
+    """
+    color: ColorDelegator | None = getattr(editwin, "color", None)
+    if color is None:
+        yield None
+        return
+    # Next filter down the percolator chain, usually the text widget
+    delegate = cast("Text", color.delegate)
+    first_line = -1
+    last_line = -1
+    # Lines inserted can push earlier edits further down
+    added_lines = 0
+
+    def touch(index: str, lines: int = 0) -> None:
+        """Remember that lines starting at index changed."""
+        nonlocal first_line, last_line, added_lines
+        line = get_line_col(index)[0]
+        first_line = line if first_line < 0 else min(first_line, line)
+        last_line = max(last_line, line + lines)
+        added_lines += lines
+
+    def insert(
+        index: str,
+        chars: str,
+        tags: str | list[str] | tuple[str, ...] | None = None,
+    ) -> None:
+        """Insert chars at index without notifying colorizer."""
+        index = color.index(index)
+        delegate.insert(index, chars, tags or ())
+        touch(index, chars.count("\n"))
+
+    def delete(index1: str, index2: str | None = None) -> None:
+        """Delete text without notifying colorizer."""
+        index1 = color.index(index1)
+        delegate.delete(index1, index2)
+        touch(index1)
+
+    try:
+        with (
+            temporary_overwrite(color, "insert", insert),
+            temporary_overwrite(color, "delete", delete),
+        ):
+            yield None
+    finally:
+        if first_line >= 0:
+            color.notify_range(
+                f"{first_line}.0",
+                f"{last_line + added_lines + 1}.0",
+            )
+
+
+class ChangeCounter(Delegator):
+    """Text filter counting inserts and deletes that reach the widget.
+
+    Placed right below the undo delegator, so typing, undo, redo and
+    edits made by extensions are all counted. If count has not changed,
+    neither has the text. Callbacks are called after every change.
+    """
+
+    def __init__(self) -> None:
+        """Initialize counter at zero."""
+        super().__init__()
+        self.count = 0
+        self.callbacks: list[Callable[[], object]] = []
+
+    def changed(self) -> None:
+        """Count change and call callbacks."""
+        self.count += 1
+        for callback in self.callbacks:
+            callback()
+
+    def insert(
+        self,
+        index: str,
+        chars: str,
+        tags: str | list[str] | tuple[str, ...] | None = None,
+    ) -> None:
+        """Count and pass on insert."""
+        cast("Text", self.delegate).insert(index, chars, tags or ())
+        self.changed()
+
+    def delete(self, index1: str, index2: str | None = None) -> None:
+        """Count and pass on delete."""
+        cast("Text", self.delegate).delete(index1, index2)
+        self.changed()
+
+
+# Change counter of each editor window, see get_change_counter
+_CHANGE_COUNTERS: weakref.WeakKeyDictionary[EditorWindow, ChangeCounter] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_change_counter(editwin: EditorWindow) -> ChangeCounter:
+    """Return change counter of editor window, installing it if needed."""
+    counter = _CHANGE_COUNTERS.get(editwin)
+    if counter is None:
+        counter = ChangeCounter()
+        counter.setdelegate(editwin.undo.delegate)
+        # UndoDelegator.setdelegate would rebind undo events for nothing
+        Delegator.setdelegate(editwin.undo, counter)
+        _CHANGE_COUNTERS[editwin] = counter
+    return counter
+
+
+def remove_change_counter(editwin: EditorWindow) -> None:
+    """Remove change counter of editor window if it was installed."""
+    counter = _CHANGE_COUNTERS.pop(editwin, None)
+    if counter is not None and counter.delegate is not None:
+        editwin.per.removefilter(counter)
+
+
+class LineEditsCommand(Command):
+    """Undoable command replacing parts of lines, storing only changed text.
+
+    Unlike deleting and re-inserting a whole region, the undo history
+    only keeps the part of each line that changed. Consecutive commands
+    with the same region are coalesced into one by UndoDelegator, so
+    realigning the same lines again does not grow the history.
+
+    lines_before should map the line number of each edit to the line
+    before the edit. It is only needed until the command is added to
+    the undo list, then it should be set to None.
+    """
+
+    def __init__(
+        self,
+        edits: list[LineEdit],
+        region: Hashable | None = None,
+        tags: str | list[str] | tuple[str, ...] = (),
+        lines_before: dict[int, str] | None = None,
+    ) -> None:
+        """Initialize with edits of separate lines."""
+        super().__init__(None, None, "")
+        self.insert_tags = tags
+        self.edits = edits
+        self.region = region
+        self.lines_before = lines_before
+
+    def __repr__(self) -> str:
+        """Return representation of self."""
+        return f"{self.__class__.__name__}({self.edits!r}, {self.region!r})"
+
+    def apply(self, text: Text, revert: bool = False) -> None:
+        """Apply or revert edits in text."""
+        for line, column, old, new in self.edits:
+            if revert:
+                old, new = new, old
+            start = f"{line}.{column}"
+            if old:
+                text.delete(start, f"{line}.{column + len(old)}")
+            if new:
+                text.insert(start, new, self.insert_tags)
+        if self.edits:
+            text.mark_set("insert", f"{self.edits[0].line}.0")
+            text.see("insert")
+
+    def do(self, text: Text) -> None:
+        """Do edits for the first time."""
+        self.marks_before = self.save_marks(text)
+        self.apply(text)
+        self.marks_after = self.save_marks(text)
+
+    def redo(self, text: Text) -> None:
+        """Redo edits."""
+        self.apply(text)
+        self.set_marks(text, self.marks_after)
+
+    def undo(self, text: Text) -> None:
+        """Revert edits."""
+        self.apply(text, revert=True)
+        self.set_marks(text, self.marks_before)
+
+    def merge(self, cmd: object) -> bool:
+        """Absorb cmd if it edits the same region right after self."""
+        if (
+            not isinstance(cmd, LineEditsCommand)
+            or self.region is None
+            or cmd.region != self.region
+            or cmd.lines_before is None
+        ):
+            return False
+        edits = {edit.line: edit for edit in self.edits}
+        for edit in cmd.edits:
+            previous = edits.pop(edit.line, None)
+            if previous is None:
+                edits[edit.line] = edit
+                continue
+            current = cmd.lines_before[edit.line]
+            combined = get_line_edit(
+                edit.line,
+                revert_line_edit(current, previous),
+                apply_line_edit(current, edit),
+            )
+            if combined is not None:
+                edits[edit.line] = combined
+        self.edits = sorted(edits.values())
+        self.marks_after = cmd.marks_after
+        return True
+
+
+def add_line_edits(
+    undo: UndoDelegator,
+    edits: list[LineEdit],
+    lines_before: Sequence[str] | None,
+    region: Hashable | None = None,
+    tags: str | list[str] | tuple[str, ...] = (),
+) -> None:
+    """Make edits as one compact undoable command.
+
+    lines_before is the text of each edited line before editing, in
+    the same order as edits. Commands with the same region made one
+    after another are coalesced into a single undo record. Without
+    lines_before, the command is never coalesced. Time spent editing
+    and updating undo history is recorded as the edit and undo phases.
+    """
+    command = LineEditsCommand(
+        edits,
+        region,
+        tags,
+        None
+        if lines_before is None
+        else {
+            edit.line: line
+            for edit, line in zip(edits, lines_before, strict=True)
+        },
+    )
+    stats = current_stats()
+    with stats.phase("edit"):
+        command.do(cast("Text", undo.delegate))
+    with stats.phase("undo"):
+        undo.addcmd(command, execute=False)
+    command.lines_before = None
 
 
 @contextmanager
@@ -365,17 +782,129 @@ def temporary_overwrite(
             setattr(object_, attribute, original)
 
 
+# Log file size that triggers rotation and number of old logs to keep
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+def configure_log(
+    max_bytes: int | None = None,
+    backup_count: int | None = None,
+) -> None:
+    """Set log file size cap and how many rotated log files to keep."""
+    global LOG_MAX_BYTES, LOG_BACKUP_COUNT
+    if max_bytes is not None:
+        LOG_MAX_BYTES = max_bytes
+    if backup_count is not None:
+        LOG_BACKUP_COUNT = backup_count
+
+
+def rotate_log(log_file: Path, backup_count: int) -> None:
+    """Rotate log file to log_file.1, log_file.1 to log_file.2 and so on."""
+    if backup_count <= 0:
+        log_file.unlink(missing_ok=True)
+        return
+    for index in range(backup_count - 1, 0, -1):
+        source = log_file.with_name(f"{log_file.name}.{index}")
+        if source.exists():
+            source.replace(log_file.with_name(f"{log_file.name}.{index + 1}"))
+    log_file.replace(log_file.with_name(f"{log_file.name}.1"))
+
+
+class LogWriter(threading.Thread):
+    """Background thread writing queued log lines in batches."""
+
+    __slots__ = ("queue",)
+
+    def __init__(self) -> None:
+        """Initialize daemon log writer thread."""
+        super().__init__(name=f"{TITLE}-log-writer", daemon=True)
+        self.queue: queue.SimpleQueue[str | threading.Event] = (
+            queue.SimpleQueue()
+        )
+
+    def write_batch(self, batch: list[str]) -> None:
+        """Append batch of lines to log file, rotating it if too big."""
+        LOGS_PATH.mkdir(parents=True, exist_ok=True)
+        log_file = LOGS_PATH / f"{TITLE}.log"
+        data = "".join(batch)
+        try:
+            size = log_file.stat().st_size
+        except OSError:
+            size = 0
+        if size and size + len(data) > LOG_MAX_BYTES:
+            rotate_log(log_file, LOG_BACKUP_COUNT)
+        with log_file.open("a", encoding="utf-8") as fp:
+            fp.write(data)
+
+    def run(self) -> None:
+        """Write everything in the queue whenever something arrives."""
+        while True:
+            item = self.queue.get()
+            batch: list[str] = []
+            flushed: list[threading.Event] = []
+            while True:
+                if isinstance(item, threading.Event):
+                    flushed.append(item)
+                else:
+                    batch.append(item)
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.write_batch(batch)
+                except OSError as exc:
+                    print(
+                        f"Failed to write {TITLE} log: {exc}",
+                        file=sys.stderr,
+                    )
+            for event in flushed:
+                event.set()
+
+
+_LOG_WRITER: LogWriter | None = None
+_LOG_WRITER_LOCK = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    """Return log writer thread, starting it if needed."""
+    global _LOG_WRITER
+    with _LOG_WRITER_LOCK:
+        if _LOG_WRITER is None or not _LOG_WRITER.is_alive():
+            _LOG_WRITER = LogWriter()
+            _LOG_WRITER.start()
+        return _LOG_WRITER
+
+
+def flush_log(timeout: float | None = 5) -> bool:
+    """Wait for queued log content to be written. Return if it was."""
+    if _LOG_WRITER is None or not _LOG_WRITER.is_alive():
+        return True
+    event = threading.Event()
+    _LOG_WRITER.queue.put(event)
+    return event.wait(timeout)
+
+
+atexit.register(flush_log)
+
+
 def extension_log(content: str) -> None:
-    """Log content to extension log file."""
-    if not LOGS_PATH.exists():
-        LOGS_PATH.mkdir(exist_ok=True)
-    log_file = LOGS_PATH / f"{TITLE}.log"
-    with log_file.open("a", encoding="utf-8") as fp:
-        format_time = time.strftime("[%Y-%m-%d %H:%M:%S] ")
-        for line in content.splitlines(keepends=True):
-            fp.write(f"{format_time}{line}")
-        if not line.endswith("\n"):
-            fp.write("\n")
+    """Log content to extension log file.
+
+    Content is queued and written by a background thread, so this never
+    blocks on file access. Use flush_log to wait for it to be written.
+    """
+    format_time = time.strftime("[%Y-%m-%d %H:%M:%S] ")
+    lines = [
+        f"{format_time}{line}" for line in content.splitlines(keepends=True)
+    ]
+    if not lines:
+        lines.append(format_time)
+    if not lines[-1].endswith("\n"):
+        lines.append("\n")
+    get_log_writer().queue.put("".join(lines))
 
 
 def extension_log_exception(exc: BaseException, print_: bool = True) -> None:
@@ -416,6 +945,180 @@ def log_exceptions_catch(function: Callable[PS, T]) -> Callable[PS, T | None]:
     return wrapper
 
 
+# Number of instrumented runs kept for statistics
+STATS_SIZE = 128
+STATS_ENABLED = False
+STATS: deque[RunStats] = deque(maxlen=STATS_SIZE)
+_STATS_LOCAL = threading.local()
+
+
+def set_stats_enabled(enabled: bool) -> None:
+    """Enable or disable recording statistics for instrumented functions."""
+    global STATS_ENABLED
+    STATS_ENABLED = enabled
+
+
+class RunStats:
+    """Phase timings and counters for one instrumented run."""
+
+    __slots__ = ("counters", "name", "phases", "started", "total")
+
+    def __init__(self, name: str) -> None:
+        """Initialize empty statistics for run of name."""
+        self.name = name
+        self.started = time.time()
+        self.total = 0.0
+        self.phases: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add time spent in with block to phase."""
+        start = time.perf_counter()
+        try:
+            yield None
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add amount to counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_chars(self, name: str, strings: Iterable[str]) -> None:
+        """Add total length of strings to counter."""
+        self.count(name, sum(map(len, strings)))
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return statistics as a JSON serializable dictionary."""
+        return {
+            "name": self.name,
+            "started": self.started,
+            "total": self.total,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+        }
+
+
+class NullStats:
+    """Statistics recorder that does nothing, used when disabled."""
+
+    __slots__ = ()
+
+    _null_context: ClassVar[AbstractContextManager[None]] = nullcontext()
+
+    def phase(self, _name: str) -> AbstractContextManager[None]:
+        """Return context manager that does nothing."""
+        return self._null_context
+
+    def count(self, _name: str, _amount: int = 1) -> None:
+        """Do nothing."""
+
+    def count_chars(self, _name: str, _strings: Iterable[str]) -> None:
+        """Do nothing, strings are never looked at."""
+
+
+NULL_STATS = NullStats()
+
+
+def current_stats() -> RunStats | NullStats:
+    """Return statistics of instrumented run in progress on this thread."""
+    stats: RunStats | NullStats = getattr(_STATS_LOCAL, "stats", NULL_STATS)
+    return stats
+
+
+def record_stats(function: Callable[PS, T]) -> Callable[PS, T]:
+    """Record phase timings and counters of calls when stats are enabled.
+
+    The wrapped function records into current_stats(). When stats are
+    disabled, only one flag check is added per call.
+    """
+
+    @wraps(function)
+    def wrapper(*args: PS.args, **kwargs: PS.kwargs) -> T:
+        """Record statistics about call if enabled."""
+        if not STATS_ENABLED or isinstance(current_stats(), RunStats):
+            return function(*args, **kwargs)
+        stats = RunStats(function.__qualname__)
+        _STATS_LOCAL.stats = stats
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stats.total = time.perf_counter() - start
+            _STATS_LOCAL.stats = NULL_STATS
+            STATS.append(stats)
+
+    return wrapper
+
+
+PROFILE_ENABLED = False
+
+
+def set_profile_enabled(enabled: bool) -> None:
+    """Enable or disable profiling functions decorated with profile_calls."""
+    global PROFILE_ENABLED
+    PROFILE_ENABLED = enabled
+
+
+def profile_calls(function: Callable[PS, T]) -> Callable[PS, T]:
+    """Profile calls with cProfile and tracemalloc when profiling is enabled.
+
+    Results are written to the logs folder, see profiling.Profile.
+    """
+
+    @wraps(function)
+    def wrapper(*args: PS.args, **kwargs: PS.kwargs) -> T:
+        """Profile call if enabled."""
+        if not PROFILE_ENABLED:
+            return function(*args, **kwargs)
+        with Profile(LOGS_PATH, f"{TITLE}-{function.__name__}"):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def dump_stats() -> str:
+    """Return recorded statistics as JSON."""
+    return json.dumps([stats.as_dict() for stats in tuple(STATS)], indent=2)
+
+
+def write_stats() -> Path:
+    """Write recorded statistics as JSON to logs folder, return path."""
+    LOGS_PATH.mkdir(parents=True, exist_ok=True)
+    stats_file = LOGS_PATH / f"{TITLE}-stats.json"
+    stats_file.write_text(dump_stats(), encoding="utf-8")
+    return stats_file
+
+
+def summarize_stats() -> str:
+    """Return human readable summary of recorded statistics."""
+    runs = tuple(STATS)
+    if not runs:
+        return "No statistics recorded."
+    phases: dict[str, float] = {}
+    counters: dict[str, int] = {}
+    for stats in runs:
+        for name, elapsed in stats.phases.items():
+            phases[name] = phases.get(name, 0.0) + elapsed
+        for name, amount in stats.counters.items():
+            counters[name] = counters.get(name, 0) + amount
+    total = sum(stats.total for stats in runs)
+    lines = [
+        f"Runs: {len(runs)}",
+        f"Mean total: {total / len(runs) * 1000:.3f} ms",
+        "",
+        "Mean phase times:",
+    ]
+    lines.extend(
+        f"  {name}: {elapsed / len(runs) * 1000:.3f} ms"
+        for name, elapsed in phases.items()
+    )
+    lines.extend(("", "Counter totals:"))
+    lines.extend(f"  {name}: {amount}" for name, amount in counters.items())
+    return "\n".join(lines)
+
+
 class Comment(NamedTuple):
     """Represents one comment."""
 
@@ -461,6 +1164,13 @@ class FilePosition(NamedTuple):
         """Return True if file position covers a range."""
         return self.line != self.line_end or self.col != self.col_end
 
+    def as_positions(self) -> tuple[TextPosition, TextPosition]:
+        """Return start and end text positions."""
+        return (
+            TextPosition(self.line, self.col),
+            TextPosition(self.line_end, self.col_end),
+        )
+
     def as_select(self) -> tuple[str, str]:
         """Return text selection region index strings."""
         return f"{self.line}.{self.col}", f"{self.line_end}.{self.col_end}"
@@ -728,31 +1438,31 @@ class BaseExtension:
         chars: str = text_win.get(*get_line_selection(line))
         return chars
 
+    def get_indent_codec(self) -> IndentCodec:
+        """Return indentation codec using tab width of editor window."""
+        return IndentCodec(self.editwin.get_tk_tabwidth())
+
     def get_line_replace_tabs(
         self,
         line: int,
         text_win: Text | None = None,
     ) -> tuple[bool, str]:
-        """Return if line uses tabs and line using spaces."""
+        """Return if line indent uses tabs and line with indent as spaces."""
         chars = self.get_line(line, text_win)
-        if chars.startswith("\t"):
-            return True, chars.replace("\t", self.get_tabwidth_indent_spaces())
+        codec = self.get_indent_codec()
+        if codec.uses_tabs(chars):
+            return True, codec.expand_line(chars)
         return False, chars
 
     def reinstate_line_tabs(self, line: str) -> str:
         """Return line with leading indent replaced with tabs."""
-        indent = get_line_indent(line)
-        indent_text = line[:indent]
-        post_indent = line[indent:]
-        return (
-            indent_text.replace(self.get_tabwidth_indent_spaces(), "\t")
-            + post_indent
-        )
+        return self.get_indent_codec().compress_line(line)
 
     def reinstate_char_tabs(self, chars: str) -> str:
         """Return potentially multiline string with indentation replaced with tabs."""
+        codec = self.get_indent_codec()
         lines = chars.splitlines(keepends=True)
-        return "".join(map(self.reinstate_line_tabs, lines))
+        return "".join(map(codec.compress_line, lines))
 
     def get_comment_line(self, indent: int, content: str) -> str:
         """Return comment line given indent and content."""
@@ -775,12 +1485,14 @@ class BaseExtension:
         self,
         comment: Comment,
         max_exist_up: int = 0,
+        codec: IndentCodec | None = None,
     ) -> bool:
         """Return True if added new comment, False if already exists.
 
         Arguments:
         ---------
             max_exist_up: Max distance upwards to look for comment to already exist.
+            codec: Indentation codec for this window, to reuse its tab width.
 
         Does not use an undo block, please use one yourself.
 
@@ -805,21 +1517,19 @@ class BaseExtension:
             if self.comment_exists(line - (i - 1), msg, editwin.text):
                 return False
 
-        # Get line checker is talking about
-        uses_tabs, chars = self.get_line_replace_tabs(line, editwin.text)
+        if codec is None or editwin is not self.editwin:
+            codec = IndentCodec(editwin.get_tk_tabwidth())
 
-        # Figure out line indent
-        indent = get_line_indent(chars)
+        # Get line checker is talking about
+        chars = self.get_line(line, editwin.text)
 
-        # Add comment line
-        chars = self.get_comment_line(indent, msg) + "\n" + chars
-        if uses_tabs:
-            chars = self.reinstate_char_tabs(chars)
+        # Add comment line above it, indented the same way
+        comment_line = self.get_comment_line(codec.get_width(chars)[1], msg)
+        if codec.uses_tabs(chars):
+            comment_line = codec.compress_line(comment_line)
 
-        # Save changes
-        start, end = get_line_selection(line)
-        editwin.text.delete(start, end)
-        editwin.text.insert(start, chars, ())
+        # Save changes, line itself stays as it is
+        editwin.text.insert(f"{line}.0", comment_line + "\n", ())
         return True
 
     def get_pointers(self, comments: list[Comment]) -> Comment | None:
@@ -828,8 +1538,8 @@ class BaseExtension:
         If none of the comment pointers are going to be visible
         with the comment prefix, returns None.
 
-        Does not handle comments that span multiple lines, assumes
-        comments are all comment.line
+        Comments spanning multiple lines point at the rest of their
+        first line.
 
         Messages must all be on the same line and be in the same file,
         otherwise ValueError is raised.
@@ -843,33 +1553,29 @@ class BaseExtension:
 
         lastcol = len(self.get_comment_line(indent, ""))
 
-        columns: set[int] = set()
-
+        spans: list[tuple[int, int]] = []
+        line_length: int | None = None
         for comment in comments:
             if comment.line != line:
                 raise ValueError(f"Comment `{comment}` not on line `{line}`")
             if comment.file != file:
                 raise ValueError(f"Comment `{comment}` not in file `{file}`")
-            if comment.column_end is None:
-                end = comment.column
-            else:
-                end = comment.column_end
-            for col in range(comment.column, end + 1):
-                columns.add(col)
-
-        new_line = ""
-        for col in sorted(columns):
-            spaces = (col - lastcol) - 1
-            if spaces < 0:
-                continue
-            new_line += " " * spaces + "^"
-            lastcol = col
+            _line, column, end_line, end = comment.get_full_span()
+            if end_line > line:
+                # Multi-line span, point at the rest of the first line
+                if line_length is None:
+                    line_length = len(self.get_line(line).rstrip("\n"))
+                end = max(column, line_length)
+            spans.append((column, end))
+
+        new_line = get_pointer_line(spans, lastcol)
 
         if not new_line.strip():
             return None
 
         return Comment(file=file, line=line + 1, contents=new_line)
 
+    @profile_calls
     def add_comments(
         self,
         comments: Sequence[Comment],
@@ -878,18 +1584,21 @@ class BaseExtension:
 
         Return dict of per file a list of lines were a comment was added.
 
-        Changes are wrapped in an undo block.
+        Changes are wrapped in an undo block and the colorizer is only
+        notified once.
         """
         file_comments: dict[str, list[int]] = {}
 
-        with undo_block(self.undo):
+        codec = self.get_indent_codec()
+        with batch_colorizer(self.editwin), undo_block(self.undo):
             total = len(comments)
             for comment in reversed(comments):
-                if self.add_comment(comment, total):
+                if self.add_comment(comment, total, codec):
                     file_comments.setdefault(comment.file, [])
                     file_comments[comment.file].append(comment.line)
         return file_comments
 
+    @profile_calls
     def add_comment_block(
         self,
         file: str,
@@ -916,6 +1625,7 @@ class BaseExtension:
         )
         return file_comments.get(file, [])
 
+    @profile_calls
     def remove_selected_extension_comments(self) -> bool:
         """Remove selected extension comments. Return if removed any comments.
 
@@ -923,10 +1633,10 @@ class BaseExtension:
         """
         # Get selected region lines
         head, _tail, _chars, lines = self.formatter.get_region()
-        region_start, _col = get_line_col(head)
+        region_start = get_line_col(head)[0]
 
         edited = False
-        with undo_block(self.undo):
+        with batch_colorizer(self.editwin), undo_block(self.undo):
             for index, line_text in reversed(tuple(enumerate(lines))):
                 # If after indent there is mypy comment
                 if line_text.lstrip().startswith(self.comment_prefix):
@@ -941,6 +1651,7 @@ class BaseExtension:
             self.text.bell()
         return edited
 
+    @profile_calls
     def remove_all_extension_comments(self) -> str:
         """Remove all extension comments.
 
@@ -952,7 +1663,7 @@ class BaseExtension:
         lines = chars.splitlines()
 
         edited = False
-        with undo_block(self.undo):
+        with batch_colorizer(self.editwin), undo_block(self.undo):
             for index, line_text in reversed(tuple(enumerate(lines))):
                 # If after indent there is mypy comment
                 if line_text.lstrip().startswith(self.comment_prefix):
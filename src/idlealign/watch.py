@@ -0,0 +1,265 @@
+"""Watch - Re-align changed parts of files as they are saved."""
+
+# Programmed by CoolCat467
+
+from __future__ import annotations
+
+# Copyright (C) 2022-2025  CoolCat467
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__title__ = "watch"
+__author__ = "CoolCat467"
+__license__ = "GNU General Public License Version 3"
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from idlealign import engine
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Sequence
+    from re import Pattern
+
+
+class FileStat(NamedTuple):
+    """Cheap file change signature."""
+
+    mtime_ns: int
+    size: int
+
+
+def scan(
+    roots: Iterable[str],
+    include: str = "*.py",
+) -> dict[str, FileStat]:
+    """Return stat signature of every file below roots matching include."""
+    stats: dict[str, FileStat] = {}
+    pending = list(roots)
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except NotADirectoryError:
+            try:
+                result = os.stat(directory)
+            except OSError:
+                continue
+            stats[directory] = FileStat(result.st_mtime_ns, result.st_size)
+            continue
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file() and fnmatch(entry.name, include):
+                    result = entry.stat()
+                    stats[entry.path] = FileStat(
+                        result.st_mtime_ns,
+                        result.st_size,
+                    )
+            except OSError:
+                continue
+    return stats
+
+
+def hash_lines(lines: Iterable[str]) -> list[int]:
+    """Return hash of each line."""
+    return [hash(line) for line in lines]
+
+
+def read_line_hashes(path: str) -> list[int] | None:
+    """Return line hashes of UTF-8 file at path or None if unreadable."""
+    try:
+        text = Path(path).read_bytes().decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+    return hash_lines(text.split("\n"))
+
+
+def get_dirty_ranges(
+    old: Sequence[int],
+    new: Sequence[int],
+) -> list[tuple[int, int]]:
+    """Return inclusive (first, last) indexes of lines in new that changed.
+
+    Arguments are line hashes from hash_lines. Where lines were only
+    removed, the lines on either side of the removal are dirty.
+    """
+    ranges: list[tuple[int, int]] = []
+    matcher = SequenceMatcher(None, old, new, autojunk=False)
+    for tag, _i1, _i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if j2 > j1:
+            ranges.append((j1, j2 - 1))
+        else:
+            ranges.append((max(0, j1 - 1), j1))
+    return ranges
+
+
+class Watcher:
+    """Poll files for changes and re-align only the dirty blocks.
+
+    Files are polled by stat signature. A change is only processed
+    once the file has stopped changing for debounce seconds, and then
+    only blocks touching lines that differ from when the file was last
+    seen are aligned, on a pool of worker threads.
+    """
+
+    __slots__ = (
+        "align_side",
+        "debounce",
+        "include",
+        "line_hashes",
+        "lock",
+        "on_aligned",
+        "pattern",
+        "pending",
+        "roots",
+        "space_wrap",
+        "stats",
+    )
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        pattern: Pattern[str],
+        space_wrap: bool = True,
+        align_side: bool = False,
+        include: str = "*.py",
+        debounce: float = 0.2,
+        on_aligned: Callable[[str], object] | None = None,
+    ) -> None:
+        """Initialize watcher and snapshot stats and lines of every file."""
+        self.roots = roots
+        self.pattern = pattern
+        self.space_wrap = space_wrap
+        self.align_side = align_side
+        self.include = include
+        self.debounce = debounce
+        self.on_aligned = on_aligned
+        self.lock = threading.Lock()
+        # Per-file line hashes from the last time each file was seen
+        self.line_hashes: dict[str, list[int]] = {}
+        # Files that changed, with signature and time first seen that way
+        self.pending: dict[str, tuple[FileStat, float]] = {}
+        self.stats = scan(roots, include)
+        for path in self.stats:
+            hashes = read_line_hashes(path)
+            if hashes is not None:
+                self.line_hashes[path] = hashes
+
+    def poll(self, now: float | None = None) -> list[str]:
+        """Return files that changed and have since settled."""
+        if now is None:
+            now = time.monotonic()
+        stats = scan(self.roots, self.include)
+        with self.lock:
+            known = self.stats
+        for path in known.keys() - stats.keys():
+            self.pending.pop(path, None)
+            with self.lock:
+                self.line_hashes.pop(path, None)
+        for path, stat in stats.items():
+            if known.get(path) == stat:
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != stat:
+                # Changed again, restart debounce timer
+                self.pending[path] = (stat, now)
+        ready = [
+            path
+            for path, (_stat, seen_at) in self.pending.items()
+            if now - seen_at >= self.debounce
+        ]
+        for path in ready:
+            stats[path] = self.pending.pop(path)[0]
+        with self.lock:
+            self.stats = {
+                path: stat
+                for path, stat in stats.items()
+                if path not in self.pending
+            }
+        return ready
+
+    def align_file(self, path: str) -> bool:
+        """Align blocks of file that changed since last seen.
+
+        Files created after the watcher started have nothing to compare
+        against, so the whole file is aligned.
+
+        Return True if file was rewritten.
+        """
+        try:
+            text = Path(path).read_bytes().decode("utf-8")
+        except (OSError, UnicodeDecodeError):
+            return False
+        lines = text.split("\n")
+        new_hashes = hash_lines(lines)
+        with self.lock:
+            old_hashes = self.line_hashes.get(path)
+
+        line_ranges = None
+        if old_hashes is not None:
+            line_ranges = get_dirty_ranges(old_hashes, new_hashes)
+            if not line_ranges:
+                return False
+
+        new_text = engine.align_text(
+            text,
+            self.pattern,
+            self.space_wrap,
+            self.align_side,
+            line_ranges,
+        )
+        if new_text is not None:
+            try:
+                Path(path).write_bytes(new_text.encode("utf-8"))
+                result = os.stat(path)
+            except OSError:
+                return False
+            new_hashes = hash_lines(new_text.split("\n"))
+        with self.lock:
+            if new_text is not None:
+                # Do not see our own write as a change
+                self.stats[path] = FileStat(result.st_mtime_ns, result.st_size)
+            self.line_hashes[path] = new_hashes
+        if new_text is not None and self.on_aligned is not None:
+            self.on_aligned(path)
+        return new_text is not None
+
+    def run(
+        self,
+        interval: float = 0.5,
+        stop: threading.Event | None = None,
+        workers: int | None = None,
+    ) -> None:
+        """Poll for changes every interval seconds until stop is set."""
+        if stop is None:
+            stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while not stop.wait(interval):
+                ready = self.poll()
+                if ready:
+                    # Finish this batch before polling again so our own
+                    # writes are recorded before the next scan
+                    list(executor.map(self.align_file, ready))
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+from typing import TYPE_CHECKING
+
+import pytest
+
+from idlealign import cli, config, engine
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+UNALIGNED = "a = 1\nbbb = 2\n"
+ALIGNED = "a   = 1\nbbb = 2\n"
+
+
+def write_files(tmp_path: Path, count: int = 3) -> list[Path]:
+    files = []
+    for index in range(count):
+        file = tmp_path / f"file_{index}.py"
+        file.write_text(UNALIGNED if index % 2 else ALIGNED, encoding="utf-8")
+        files.append(file)
+    return files
+
+
+def test_expand_paths(tmp_path: Path) -> None:
+    files = write_files(tmp_path)
+    (tmp_path / "notes.txt").write_text("x = 1\n", encoding="utf-8")
+    expect = sorted(map(str, files))
+    assert cli.expand_paths([str(tmp_path)]) == expect
+    assert cli.expand_paths([str(tmp_path / "*.py"), str(files[0])]) == expect
+    assert cli.expand_paths([str(tmp_path / "missing.py")]) == []
+
+
+def test_check_and_write(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    files = write_files(tmp_path)
+    cache = tmp_path / "cache.json"
+    args = [str(tmp_path), "--pattern", "=", "--cache", str(cache)]
+
+    assert cli.main(["align", "--check", *args]) == 1
+    assert capsys.readouterr().out == f"would align {files[1]}\n"
+    assert files[1].read_text(encoding="utf-8") == UNALIGNED
+
+    assert cli.main(["align", "--write", *args]) == 0
+    assert capsys.readouterr().out == f"aligned {files[1]}\n"
+    assert files[1].read_text(encoding="utf-8") == ALIGNED
+
+    assert cli.main(["align", "--check", *args]) == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_mapped_file(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(cli, "MAPPED_MIN_BYTES", 0)
+    files = write_files(tmp_path, 2)
+    options = cli.AlignOptions(engine.compile_pattern("=", "literal"))
+    assert cli.align_file(str(files[1]), options) == cli.FileResult(
+        str(files[1]),
+        True,
+    )
+    result = cli.align_file(str(files[1]), options, write=True)
+    assert result.changed
+    assert files[1].read_text(encoding="utf-8") == ALIGNED
+    expect = cli.get_digest(ALIGNED.encode(), options)
+    assert result.digest == expect
+    assert cli.get_file_digest(str(files[1]), options) == expect
+    assert cli.align_file(str(files[0]), options).digest == expect
+
+
+def test_profile(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    monkeypatch.setattr(config, "get_logs_dir", lambda: tmp_path / "logs")
+    files = write_files(tmp_path)
+    args = [str(files[0]), "--pattern", "=", "--no-cache", "--jobs", "1"]
+    assert cli.main(["--profile", "align", "--check", *args]) == 0
+    assert "Wrote" in capsys.readouterr().err
+    assert len(list((tmp_path / "logs").glob("idlealign-align-*.pstats"))) == 1
+    assert len(list((tmp_path / "logs").glob("*.tracemalloc"))) == 1
+
+
+def test_profile_no_idlelib_import(tmp_path: Path) -> None:
+    files = write_files(tmp_path, 1)
+    code = (
+        "import sys, idlealign.cli;"
+        f"idlealign.cli.main(['--profile', 'align', {str(files[0])!r},"
+        "'--check', '--pattern', '=', '--no-cache']);"
+        "print('tkinter' in sys.modules or 'idlelib.config' in sys.modules)"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "HOME": str(tmp_path)},
+    )
+    assert result.stdout.strip() == "False"
+    logs = tmp_path / ".idlerc" / "logs"
+    assert len(list(logs.glob("idlealign-align-*.pstats"))) == 1
+
+
+def test_cache_skips_unchanged(tmp_path: Path) -> None:
+    files = write_files(tmp_path)
+    options = cli.AlignOptions(engine.compile_pattern("="))
+    cache = cli.ContentCache(tmp_path / "cache.json")
+    paths = list(map(str, files))
+
+    results = cli.align_files(paths, options, write=True, cache=cache)
+    assert [result.changed for result in results] == [False, True, False]
+    cache.save()
+
+    cache = cli.ContentCache(tmp_path / "cache.json")
+    assert cli.align_files(paths, options, cache=cache) == []
+
+    files[0].write_text(UNALIGNED, encoding="utf-8")
+    results = cli.align_files(paths, options, cache=cache)
+    assert results == [cli.FileResult(str(files[0]), True)]
+
+
+def test_cache_keyed_by_options(tmp_path: Path) -> None:
+    files = write_files(tmp_path, 1)
+    cache = cli.ContentCache(None)
+    pattern = engine.compile_pattern("=")
+    paths = [str(files[0])]
+    cli.align_files(paths, cli.AlignOptions(pattern), cache=cache)
+    assert cli.align_files(paths, cli.AlignOptions(pattern), cache=cache) == []
+    assert cli.align_files(
+        paths,
+        cli.AlignOptions(pattern, space_wrap=False),
+        cache=cache,
+    )
+
+
+def test_process_pool(tmp_path: Path) -> None:
+    files = write_files(tmp_path, cli.MIN_POOL_FILES)
+    options = cli.AlignOptions(engine.compile_pattern("="))
+    results = cli.align_files(list(map(str, files)), options, jobs=2)
+    assert sum(result.changed for result in results) == len(files) // 2
+
+
+def run_git(*args: str) -> None:
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@test"]
+    subprocess.run([*git, *args], check=True)  # noqa: S603
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+def test_diff_only_aligns_changed_blocks(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    file = tmp_path / "config.py"
+    file.write_text("a = 1\nbbb = 2\n\nc = 3\nddd = 4\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    run_git("init", "-q")
+    run_git("add", "config.py")
+    run_git("commit", "-q", "-m", "initial")
+    file.write_text("a = 1\nbbb = 2\n\nc = 3\ndddd = 4\n", encoding="utf-8")
+
+    args = ["align", ".", "--write", "--no-cache", "-p", "=", "--diff"]
+    assert cli.main(args) == 0
+    assert capsys.readouterr().out == "aligned config.py\n"
+    assert file.read_text(encoding="utf-8") == (
+        "a = 1\nbbb = 2\n\nc    = 3\ndddd = 4\n"
+    )
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from typing import TYPE_CHECKING
+
+import pytest
+
+from idlealign import config
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def write_configs(
+    tmp_path: Path,
+    default: str,
+    user: str,
+) -> config.ExtensionConfig:
+    idle_dir = tmp_path / "idlelib"
+    user_dir = tmp_path / ".idlerc"
+    idle_dir.mkdir()
+    user_dir.mkdir()
+    (idle_dir / "config-extensions.def").write_text(default, "utf-8")
+    (user_dir / "config-extensions.cfg").write_text(user, "utf-8")
+    return config.ExtensionConfig(idle_dir, user_dir)
+
+
+@pytest.mark.parametrize(
+    ("default", "user", "has_user", "expected"),
+    [
+        (
+            "[zzdummy]\nenable = False\n",
+            "[idlealign]\nenable = True\n",
+            False,
+            {
+                "idlealign": config.ExtensionStatus("idlealign", False, False),
+                "zzdummy": config.ExtensionStatus("zzdummy", True, False),
+            },
+        ),
+        (
+            "[idleuserextend]\nenable = True\n",
+            "[idlealign]\nenable = True\n[zzdummy]\nenable = False\n",
+            True,
+            {
+                "idlealign": config.ExtensionStatus("idlealign", True, True),
+                "zzdummy": config.ExtensionStatus("zzdummy", True, False),
+            },
+        ),
+        (
+            "[idleuserextend]\nenable = True\n[idlealign]\n",
+            "[idleuserextend]\nenable = False\n",
+            False,
+            {
+                "idlealign": config.ExtensionStatus("idlealign", True, True),
+                "zzdummy": config.ExtensionStatus("zzdummy", False, False),
+            },
+        ),
+    ],
+)
+def test_extension_config_check(
+    tmp_path: Path,
+    default: str,
+    user: str,
+    has_user: bool,
+    expected: dict[str, config.ExtensionStatus],
+) -> None:
+    extensions = write_configs(tmp_path, default, user)
+    assert extensions.has_user_extend() is has_user
+    assert extensions.check(expected) == expected
+    assert extensions.get_config_path() == (
+        extensions.user_path if has_user else extensions.default_path
+    )
+
+
+def test_extension_config_missing_files(tmp_path: Path) -> None:
+    extensions = config.ExtensionConfig(tmp_path / "a", tmp_path / "b")
+    assert not extensions.has_user_extend()
+    assert extensions.get_registered() == set()
+
+
+def test_check_installed(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    extensions = write_configs(tmp_path, "", "")
+    assert not config.check_installed(
+        "idlealign",
+        "1.0",
+        lambda: "\n[idlealign]\nenable = True",
+        extensions,
+    )
+    output = capsys.readouterr().out
+    assert "echo -e '\\n[idlealign]\\nenable = True' | sudo tee -a" in output
+
+    (tmp_path / "installed").mkdir()
+    extensions = write_configs(tmp_path / "installed", "[idlealign]\n", "")
+    assert config.check_installed(
+        "idlealign",
+        "1.0",
+        pytest.fail,
+        extensions,
+    )
+    assert "Configuration should be good! (v1.0)" in capsys.readouterr().out
+
+
+def test_no_idlelib_import() -> None:
+    code = (
+        "import sys, idlealign, idlealign.cli;"
+        "idlealign.config.ExtensionConfig().check(['idlealign']);"
+        "print('tkinter' in sys.modules or 'idlelib.config' in sys.modules)"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
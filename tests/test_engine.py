@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import re
+from idlelib.searchengine import SearchEngine
+from tkinter import Tcl
+
+import pytest
+
+from idlealign import engine
+
+
+@pytest.mark.parametrize(
+    ("first", "last", "size", "expect"),
+    [
+        (1, 10, 64, range(1, 11)),
+        (5, 5, 64, range(5, 6)),
+        (1, 100, 10, range(1, 101, 10)),
+        (1, 101, 10, range(1, 102, 11)),
+        (7, 3, 64, range(0)),
+    ],
+)
+def test_sample_line_numbers(
+    first: int,
+    last: int,
+    size: int,
+    expect: range,
+) -> None:
+    assert engine.sample_line_numbers(first, last, size) == expect
+
+
+def test_sample_line_numbers_bounded() -> None:
+    assert len(engine.sample_line_numbers(1, 1_000_000, 64)) <= 64
+
+
+def test_count_delimiters() -> None:
+    assert engine.count_delimiters(["a = 1", "b: int = 2", "c"]) == {
+        "=": 2,
+        ":": 1,
+        "#": 0,
+        "|": 0,
+    }
+
+
+@pytest.mark.parametrize(
+    ("lines", "expect"),
+    [
+        (["a = 1", "bee = 2"], "="),
+        (["a: int", "b: str = 'x'", "c: float"], ":"),
+        (["x  # one", "yy # two"], "#"),
+        (["| a | b |", "| c | d |"], "|"),
+        (["a = b: c", "d = e: f"], "="),
+        (["a = 1", "nothing here"], None),
+        (["single = line"], "="),
+        (["plain", "text"], None),
+        ([], None),
+    ],
+)
+def test_detect_delimiter(lines: list[str], expect: str | None) -> None:
+    assert engine.detect_delimiter(lines) == expect
+
+
+@pytest.mark.parametrize(
+    ("pattern", "mode", "expect"),
+    [
+        ("a|b", "regex", "a|b"),
+        ("a|b", "literal", "a\\|b"),
+        ("=", "regex", "="),
+    ],
+)
+def test_compile_pattern(pattern: str, mode: str, expect: str) -> None:
+    assert engine.compile_pattern(pattern, mode).pattern == expect
+
+
+def test_compile_pattern_bad_mode() -> None:
+    with pytest.raises(ValueError, match="Unknown pattern mode"):
+        engine.compile_pattern("=", "glob")
+
+
+def test_parse_preset() -> None:
+    preset = engine.parse_preset("colon", ":", False, " Right ", "Literal")
+    assert preset.name == "colon"
+    assert preset.pattern.pattern == ":"
+    assert not preset.space_wrap
+    assert preset.align_side
+
+
+@pytest.mark.parametrize(
+    ("pattern", "side", "match"),
+    [("", "left", "empty pattern"), ("=", "up", "side must be")],
+)
+def test_parse_preset_invalid(pattern: str, side: str, match: str) -> None:
+    with pytest.raises(ValueError, match=match):
+        engine.parse_preset("bad", pattern, True, side)
+
+
+EQUALS = engine.compile_pattern("=", "literal")
+
+
+@pytest.mark.parametrize(
+    ("pattern", "expect"),
+    [
+        ("=", "="),
+        (re.escape("a.b c#|"), "a.b c#|"),
+        (r"\\", "\\"),
+        (r"\d", None),
+        ("a|b", None),
+        ("x*", None),
+        ("(?i)x", None),
+    ],
+)
+def test_get_literal(pattern: str, expect: str | None) -> None:
+    assert engine.get_literal(re.compile(pattern)) == expect
+
+
+@pytest.mark.parametrize(
+    ("source", "expect"),
+    [("->", "->"), (re.escape("a = b"), "a = b"), (r"\bfoo\b", None)],
+)
+def test_parse_literal(source: str, expect: str | None) -> None:
+    assert engine.parse_literal(source) == expect
+
+
+@pytest.mark.parametrize(
+    ("phrase", "regex", "word", "expect"),
+    [
+        ("=", False, False, "="),
+        ("->", False, False, "->"),
+        ("#", False, False, "#"),
+        (":", True, False, ":"),
+        ("a =", False, False, None),
+        ("=", False, True, None),
+    ],
+)
+def test_get_literal_search_engine(
+    phrase: str,
+    regex: bool,
+    word: bool,
+    expect: str | None,
+) -> None:
+    # Search engine ignores case by default
+    search_engine = SearchEngine(Tcl())
+    search_engine.setpat(phrase)
+    search_engine.revar.set(regex)
+    search_engine.wordvar.set(word)
+    pattern = search_engine.getprog()
+    assert pattern is not None
+    assert pattern.flags & re.IGNORECASE
+    assert engine.get_literal(pattern) == expect
+
+
+@pytest.mark.parametrize(
+    ("space_wrap", "align_side", "expect"),
+    [
+        (True, False, ["a   = 1", "bcd = 2", "no match"]),
+        (False, False, ["a  =1", "bcd=2", "no match"]),
+        (True, True, ["a =     1", "bcd   = 2", "no match"]),
+        (False, True, ["a =    1", "bcd   =2", "no match"]),
+    ],
+)
+def test_align_lines(
+    space_wrap: bool,
+    align_side: bool,
+    expect: list[str],
+) -> None:
+    lines = ["a = 1", "bcd   =   2", "no match"]
+    assert engine.align_lines(lines, EQUALS, space_wrap, align_side) == expect
+
+
+def test_match_and_pad_lines() -> None:
+    lines = ["a = 1", "no match", "bcd=2"]
+    line_data, width = engine.match_lines(lines, EQUALS)
+    assert line_data == {0: ("a", " = 1"), 2: ("bcd", " = 2")}
+    assert width == 3
+    assert engine.pad_lines(lines, line_data, width) == [
+        "a   = 1",
+        "no match",
+        "bcd = 2",
+    ]
+    assert engine.pad_lines(lines, {}, width) is None
+
+
+@pytest.mark.parametrize(
+    ("old", "new", "expect"),
+    [
+        ("a = 1", "a = 1", None),
+        ("a = 1", "a   = 1", engine.LineEdit(3, 2, "", "  ")),
+        ("bcd   =   2", "bcd = 2", engine.LineEdit(3, 4, "  =  ", "=")),
+        ("aaa", "aa", engine.LineEdit(3, 2, "a", "")),
+        ("ab", "xy", engine.LineEdit(3, 0, "ab", "xy")),
+    ],
+)
+def test_get_line_edit(
+    old: str,
+    new: str,
+    expect: engine.LineEdit | None,
+) -> None:
+    edit = engine.get_line_edit(3, old, new)
+    assert edit == expect
+    if edit is not None:
+        assert engine.apply_line_edit(old, edit) == new
+        assert engine.revert_line_edit(new, edit) == old
+
+
+def test_get_line_edits() -> None:
+    old = ["a = 1", "same", "bcd=2"]
+    new = ["a   = 1", "same", "bcd = 2"]
+    assert engine.get_line_edits(old, new, 10) == [
+        engine.LineEdit(10, 2, "", "  "),
+        engine.LineEdit(12, 3, "=", " = "),
+    ]
+
+
+def test_align_lines_unchanged() -> None:
+    assert engine.align_lines(["a   = 1", "bcd = 2"], EQUALS) is None
+    assert engine.align_lines(["no", "match"], EQUALS) is None
+
+
+def test_find_blocks() -> None:
+    lines = [
+        "a = 1",
+        "bb = 2",
+        "",
+        "c = 3",
+        "    d = 4",
+        "    ee = 5",
+        "    f = 6",
+        "g = 7",
+        "h = 8",
+    ]
+    assert engine.find_blocks(lines, EQUALS) == [(0, 2), (4, 7), (7, 9)]
+    assert engine.find_blocks(lines, EQUALS, same_indent=False) == [
+        (0, 2),
+        (3, 9),
+    ]
+    assert engine.find_blocks(lines, EQUALS, min_lines=1) == [
+        (0, 2),
+        (3, 4),
+        (4, 7),
+        (7, 9),
+    ]
+
+
+def test_align_blocks() -> None:
+    lines = ["a = 1", "bb = 2", "", "ccc = 3", "d    = 4"]
+    assert engine.align_blocks(
+        lines,
+        engine.find_blocks(lines, EQUALS),
+        EQUALS,
+    ) == [(0, ["a  = 1", "bb = 2"]), (3, ["ccc = 3", "d   = 4"])]
+
+
+def test_align_text_keeps_line_endings() -> None:
+    text = "a = 1\r\nbb = 2\r\n\r\nx = 1\n"
+    assert engine.align_text(text, EQUALS) == "a  = 1\r\nbb = 2\r\n\r\nx = 1\n"
+    assert engine.align_text("a  = 1\nbb = 2\n", EQUALS) is None
+
+
+def test_get_default_preset() -> None:
+    preset = engine.get_default_preset("colon")
+    assert preset.pattern.pattern == ":"
+    assert preset.align_side
+    with pytest.raises(KeyError):
+        engine.get_default_preset("missing")
+
+
+def test_find_block_around() -> None:
+    lines = ["a = 1", "bb = 2", "    c = 3", "dd = 4", "", "e = 5"]
+    assert engine.find_block_around(lines, 1, EQUALS) == (0, 2)
+    assert engine.find_block_around(lines, 2, EQUALS) == (2, 3)
+    assert engine.find_block_around(lines, 2, EQUALS, same_indent=False) == (
+        0,
+        4,
+    )
+    assert engine.find_block_around(lines, 4, EQUALS) is None
+    assert engine.find_block_around(lines, 9, EQUALS) is None
+
+
+def test_expand_blocks() -> None:
+    lines = ["a = 1", "bb = 2", "", "c = 3", "dd = 4", "eee = 5", "", "f = 6"]
+    assert engine.expand_blocks(lines, [(1, 1)], EQUALS) == [(0, 2)]
+    assert engine.expand_blocks(lines, [(4, 4), (5, 7)], EQUALS) == [(3, 6)]
+    assert engine.expand_blocks(lines, [(0, 7)], EQUALS) == [(0, 2), (3, 6)]
+    assert engine.expand_blocks(lines, [(2, 2)], EQUALS) == []
+
+
+def test_align_text_line_ranges() -> None:
+    text = "a = 1\nbb = 2\n\nc = 3\ndd = 4\n"
+    assert engine.align_text(text, EQUALS, line_ranges=[(4, 4)]) == (
+        "a = 1\nbb = 2\n\nc  = 3\ndd = 4\n"
+    )
+    assert engine.align_text(text, EQUALS, line_ranges=[(2, 2)]) is None
+
+
+@pytest.mark.parametrize(
+    ("align_side", "expect"),
+    [(False, {0: 2}), (True, {0: 2, 4: 1})],
+)
+def test_get_padding(align_side: bool, expect: dict[int, int]) -> None:
+    lines = ["a = 1", "bcd = 2", "", "x == 3", "yy=4"]
+    pattern = engine.compile_pattern("=+")
+    assert engine.get_padding(lines, pattern, align_side) == expect
+
+
+@pytest.mark.parametrize(
+    ("line", "expect"),
+    [
+        ("\tx", "    x"),
+        ("  \tx", "    x"),
+        ("\t  \tx", "        x"),
+        ("\tx\ty", "    x\ty"),
+        ("x", "x"),
+        ("", ""),
+    ],
+)
+def test_indent_codec_expand(line: str, expect: str) -> None:
+    assert engine.IndentCodec(4).expand_line(line) == expect
+
+
+def test_indent_codec_compress() -> None:
+    codec = engine.IndentCodec(4)
+    assert codec.compress_line("      x\t y") == "\t  x\t y"
+    assert codec.uses_tabs("  \tx")
+    assert not codec.uses_tabs("  x\ty")
+
+
+def test_indent_codec_restore() -> None:
+    codec = engine.IndentCodec(4)
+    old = ["\ta = 1", "  \tbcd = 2", "    c = 3"]
+    new = ["    a   = 1", "    bcd = 2", "    c   = 3"]
+    assert codec.restore(new, old) == [
+        "\ta   = 1",
+        "  \tbcd = 2",
+        "    c   = 3",
+    ]
+
+
+def test_align_lines_tabs() -> None:
+    lines = ["\ta = 1", "    bcd = 2"]
+    assert engine.align_lines(lines, EQUALS, codec=engine.IndentCodec(4)) == [
+        "\ta   = 1",
+        "    bcd = 2",
+    ]
+
+
+def test_align_band() -> None:
+    lines = ["x=1 | a = 1 | y", "x=2 | bcd = 2 | yy", "x=3"]
+    # Band from column 6, past the end of the short last line
+    bands = [line[6:14] for line in lines]
+    assert bands == ["a = 1 | ", "bcd = 2 ", ""]
+    edits = engine.align_band(bands, 6, EQUALS)
+    assert edits == [engine.LineEdit(0, 8, "", "  ")]
+    assert engine.apply_line_edit(lines[0], edits[0]) == "x=1 | a   = 1 | y"
+    assert engine.align_band(["", ""], 6, EQUALS) == []
+
+
+@pytest.mark.parametrize(
+    ("lines", "space_wrap", "align_side", "expect"),
+    [
+        (["a   = 1", "bcd = 2", "no match"], True, False, True),
+        (["a    = 1", "bcd  = 2"], True, False, False),
+        (["a = 1", "bcd = 2"], True, False, False),
+        (["a  =1", "bcd=2"], False, False, True),
+        (["a =     1", "bcd   = 2"], True, True, True),
+        (["no", "match"], True, False, True),
+        ([], True, False, True),
+    ],
+)
+def test_is_aligned(
+    lines: list[str],
+    space_wrap: bool,
+    align_side: bool,
+    expect: bool,
+) -> None:
+    assert engine.is_aligned(lines, EQUALS, space_wrap, align_side) is expect
+    unchanged = engine.align_lines(lines, EQUALS, space_wrap, align_side)
+    assert (unchanged is None) is expect
+
+
+def test_is_text_aligned() -> None:
+    text = "a   = 1\r\nbcd = 2\n\nx = 1\nyy = 2\n"
+    assert not engine.is_text_aligned(text, EQUALS)
+    assert engine.is_text_aligned(text, EQUALS, line_ranges=[(0, 0)])
+    aligned = engine.align_text(text, EQUALS)
+    assert aligned is not None
+    assert engine.is_text_aligned(aligned, EQUALS)
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import gc
+import re
+import weakref
+from idlelib.percolator import Percolator
+from idlelib.undo import UndoDelegator
+from tkinter import TclError, Text, Tk, Toplevel
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from idlealign import extension, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from idlelib.pyshell import PyShellEditorWindow
+
+
+class FakeEditorWindow:
+    """Just enough of an editor window for the extension."""
+
+    def __init__(self, text: Text, flist: FakeFileList | None = None) -> None:
+        self.text = text
+        self.per = Percolator(text)
+        self.undo = UndoDelegator()
+        self.per.insertfilter(self.undo)
+        self.fregion = None
+        self.io = None
+        self.flist = flist
+
+    def get_tk_tabwidth(self) -> int:
+        """Return tab width."""
+        return 8
+
+
+class FakeFileList:
+    """Just enough of a file list to find open editor windows."""
+
+    def __init__(self) -> None:
+        self.inversedict: dict[FakeEditorWindow, str | None] = {}
+        self.pyshell = None
+
+
+@pytest.fixture
+def root() -> Iterator[Tk]:
+    try:
+        root = Tk()
+    except TclError:
+        pytest.skip("No display to create Tk windows on")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+@pytest.fixture
+def text(root: Tk) -> Text:
+    return Text(root)
+
+
+@pytest.fixture
+def ext(text: Text) -> Iterator[extension.idlealign]:
+    editwin = FakeEditorWindow(text)
+    ext = extension.idlealign(cast("PyShellEditorWindow", editwin))
+    yield ext
+    ext.close()
+
+
+def get_text(text: Text) -> str:
+    chars: str = text.get("1.0", "end-1c")
+    return chars
+
+
+def test_align_tagged(text: Text, ext: extension.idlealign) -> None:
+    original = "a = 1\nbbb = 2\nx\ncc = 3\nd = 4\nee = 5\n"
+    text.insert("1.0", original)
+    text.tag_add("hit", "1.0", "3.0")
+    text.tag_add("hit", "5.2", "6.1")
+
+    assert ext.align_tagged("hit", re.compile("="))
+    assert get_text(text) == "a   = 1\nbbb = 2\nx\ncc = 3\nd  = 4\nee = 5\n"
+
+    # Every region is undone at once
+    ext.undo.undo_event(None)
+    assert get_text(text) == original
+
+
+def test_align_tagged_nothing_tagged(
+    text: Text,
+    ext: extension.idlealign,
+) -> None:
+    text.insert("1.0", "a = 1\nbbb = 2\n")
+    assert not ext.align_tagged("hit", re.compile("="))
+    assert get_text(text) == "a = 1\nbbb = 2\n"
+
+
+@pytest.mark.parametrize(
+    ("literal", "expect"),
+    [
+        ("=", True),
+        ("Key", True),
+        ("->", True),
+        ("is", False),
+        ("S", False),
+        ("\u212a", False),
+        ("\u00e9", False),
+        ("\u2192", True),
+    ],
+)
+def test_can_search_nocase(literal: str, expect: bool) -> None:
+    assert extension.can_search_nocase(literal) == expect
+
+
+def test_search_lines(text: Text, ext: extension.idlealign) -> None:
+    text.insert("1.0", "a = 1\nX = 2\nfoo\nx = 3\nfoo bar\nfoobar\n")
+    search = ext.search_lines
+
+    assert search(re.compile("x"), "1.0", "end") == [4]
+    # Ignoring case, like the search engine does by default
+    assert search(re.compile("x", re.IGNORECASE), "1.0", "end") == [2, 4]
+    assert search(re.compile("=", re.IGNORECASE), "1.0", "3.0") == [1, 2]
+    # Whole word patterns are left to Python
+    assert search(re.compile(r"\bfoo\b"), "1.0", "end") is None
+    assert search(re.compile(r"\bfoo\b", re.IGNORECASE), "1.0", "end") is None
+    assert search(re.compile("o+"), "1.0", "end") is None
+    assert search(re.compile("s", re.IGNORECASE), "1.0", "end") is None
+
+
+@pytest.mark.parametrize(
+    ("pattern", "original", "expect"),
+    [
+        (
+            re.compile("x", re.IGNORECASE),
+            "aX1\nno\nbbbx2\n",
+            "a  X1\nno\nbbbx2\n",
+        ),
+        (re.compile(r"\bx\b"), "a x 1\nno\nbbb x 2\n", "a  x1\nno\nbbbx2\n"),
+    ],
+)
+def test_align_selection_prefilter(
+    monkeypatch: pytest.MonkeyPatch,
+    text: Text,
+    ext: extension.idlealign,
+    pattern: re.Pattern[str],
+    original: str,
+    expect: str,
+) -> None:
+    monkeypatch.setattr(extension.idlealign, "tcl_prefilter", "True")
+    text.insert("1.0", original)
+    assert ext.align_selection(("1.0", "3.0"), pattern, False)
+    assert get_text(text) == expect
+
+
+def test_virtual_alignment_refreshes_on_change(
+    monkeypatch: pytest.MonkeyPatch,
+    text: Text,
+    ext: extension.idlealign,
+) -> None:
+    text.insert("1.0", "a = 1\nbbb = 2\n")
+    changes = utils.get_change_counter(ext.editwin)
+    virtual = extension.VirtualAlignment(text, re.compile("="), changes)
+    virtual.start()
+    assert changes.callbacks == [virtual.schedule]
+    virtual.refresh()
+    assert text.tag_names("1.0") == (f"{virtual.TAG_PREFIX}2",)
+
+    fetched: list[tuple[str, str | None]] = []
+    get = text.get
+
+    def record_get(index1: str, index2: str | None = None) -> str:
+        fetched.append((index1, index2))
+        chars: str = get(index1, index2)
+        return chars
+
+    monkeypatch.setattr(text, "get", record_get)
+    # Nothing changed, so nothing is fetched
+    virtual.refresh()
+    assert not fetched
+    ext.undo.insert("1.0", "cc")
+    virtual.refresh()
+    assert fetched
+
+    virtual.stop()
+    assert not changes.callbacks
+    assert virtual.after_id is None
+    assert text.tag_names("1.0") == ()
+
+
+@pytest.mark.parametrize(
+    ("selection", "expect"),
+    [
+        (("1.4", "3.9"), "x | a  = 1 | y\nx | bb = 2 | y\nx | c  = 3 | y\n"),
+        # Dragged over whole lines, the last line is not selected
+        (("1.4", "3.0"), "x | a  = 1 | y\nx | bb = 2 | y\nx | c = 3 | y\n"),
+        (("1.4", "4.0"), "x | a  = 1 | y\nx | bb = 2 | y\nx | c  = 3 | y\n"),
+    ],
+)
+def test_align_rectangle(
+    text: Text,
+    ext: extension.idlealign,
+    selection: tuple[str, str],
+    expect: str,
+) -> None:
+    text.insert("1.0", "x | a = 1 | y\nx | bb = 2 | y\nx | c = 3 | y\n")
+    assert ext.align_rectangle(selection, re.compile("="))
+    assert get_text(text) == expect
+
+
+def test_align_selection_memo(text: Text, ext: extension.idlealign) -> None:
+    text.insert("1.0", "a=1\nbbb = 2\n")
+    equals = re.compile("=")
+    assert ext.align_selection(("1.0", "2.0"), equals)
+    assert get_text(text) == "a   = 1\nbbb = 2\n"
+    assert len(ext.memo.entries) == 1
+    assert not ext.align_selection(("1.0", "2.0"), equals)
+
+
+def test_align_selection_memo_unsettled(
+    text: Text,
+    ext: extension.idlealign,
+) -> None:
+    text.insert("1.0", "a=1\nbbb = 2\n")
+    spaced = re.compile(r"\s*=\s*")
+    assert ext.align_selection(("1.0", "2.0"), spaced)
+    assert get_text(text) == "a   = 1\nbbb  =  2\n"
+    # Aligning again changes lines again, so it is not remembered
+    assert not ext.memo.entries
+    assert ext.align_selection(("1.0", "2.0"), spaced)
+    assert get_text(text) == "a      =  1\nbbb   =   2\n"
+
+
+@pytest.mark.parametrize(
+    ("selection", "expect"),
+    [
+        (("1.0", "1.0"), "a   = 1\nbbb = 2\n\ncc = 3\nd  = 4\n"),
+        (("4.1", "5.0"), "a = 1\nbbb = 2\n\ncc = 3\nd  = 4\n"),
+    ],
+)
+def test_align_blocks(
+    text: Text,
+    ext: extension.idlealign,
+    selection: tuple[str, str],
+    expect: str,
+) -> None:
+    text.insert("1.0", "a = 1\nbbb = 2\n\ncc = 3\nd = 4\n")
+    assert ext.align_blocks(selection, re.compile("="))
+    assert get_text(text) == expect
+
+
+def test_align_blocks_form_feed(text: Text, ext: extension.idlealign) -> None:
+    # Only newlines end lines in Tk text, not other line boundaries
+    text.insert("1.0", "x = 1\nyyy = 2\n\x0czz = 3\nw = 4\n")
+    assert ext.align_blocks(("1.0", "1.0"), re.compile("="))
+    assert get_text(text) == "x   = 1\nyyy = 2\n\x0czz = 3\nw = 4\n"
+
+
+def test_align_regions_form_feed(text: Text, ext: extension.idlealign) -> None:
+    text.insert("1.0", "x = 1\nyyy = 2\n\x0czz = 3\nw = 4\n")
+    assert ext.align_regions([(1, 4)], re.compile("="))
+    assert get_text(text) == "x   = 1\nyyy = 2\n\x0czz = 3\nw   = 4\n"
+
+
+def test_align_open_files(root: Tk, text: Text) -> None:
+    flist = FakeFileList()
+    editwin = FakeEditorWindow(text, flist)
+    other = FakeEditorWindow(Text(root), flist)
+    flist.inversedict = {editwin: "changed.py", other: "aligned.py"}
+    text.insert("1.0", "a = 1\nbbb = 2\n\x0cc = 3\n")
+    other.text.insert("1.0", "a   = 1\nbbb = 2\n")
+
+    ext = extension.idlealign(cast("PyShellEditorWindow", editwin))
+    try:
+        assert ext.align_open_files(re.compile("=")) == 1
+    finally:
+        ext.close()
+    assert get_text(text) == "a   = 1\nbbb = 2\n\x0cc = 3\n"
+    assert get_text(other.text) == "a   = 1\nbbb = 2\n"
+    assert not other.undo.undolist
+
+
+def test_dialog_per_window(
+    root: Tk,
+    text: Text,
+    ext: extension.idlealign,
+) -> None:
+    other = extension.idlealign(
+        cast("PyShellEditorWindow", FakeEditorWindow(Text(root))),
+    )
+    try:
+        dialog = ext.window
+        assert ext.window is dialog
+        assert other.window is not dialog
+        assert dialog.extension.text is text
+        assert other.window.extension.text is other.text
+    finally:
+        other.close()
+
+
+def test_dialog_prewarmed(root: Tk, ext: extension.idlealign) -> None:
+    root.update()
+    dialog = extension.idlealign.dialogs[ext.editwin]
+    assert dialog.top is not None
+    assert cast("Toplevel", dialog.top).wm_state() == "withdrawn"
+
+
+def test_close_releases_window(root: Tk, text: Text) -> None:
+    editwin = FakeEditorWindow(text)
+    ext = extension.idlealign(cast("PyShellEditorWindow", editwin))
+    root.update()
+    assert ext.editwin in extension.idlealign.dialogs
+    ext.close()
+    assert ext.editwin not in extension.idlealign.dialogs
+
+    # Like IDLE closing the window
+    editwin.per.close()
+    text.destroy()
+    window_ref = weakref.ref(editwin)
+    del editwin, ext
+    gc.collect()
+    assert window_ref() is None
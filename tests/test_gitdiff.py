@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import pytest
+
+from idlealign import gitdiff
+
+DIFF = """\
+diff --git src/a.py src/a.py
+index 1111111..2222222 100644
+--- src/a.py
++++ src/a.py
+@@ -3 +3 @@ def thing():
+-x = 1
++x  = 1
+@@ -10,0 +11,2 @@ def other():
++y = 2
++z = 3
+@@ -20,2 +22,0 @@
+-gone = 1
+-gone = 2
+diff --git old.py old.py
+deleted file mode 100644
+--- old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-removed = 1
+diff --git new.py new.py
+new file mode 100644
+--- /dev/null
++++ new.py
+@@ -0,0 +1,3 @@
++a = 1
++b = 2
++c = 3
+"""
+
+
+def test_parse_diff() -> None:
+    assert gitdiff.parse_diff(DIFF) == {
+        "src/a.py": [(3, 3), (11, 12), (22, 23)],
+        "new.py": [(1, 3)],
+    }
+
+
+def test_parse_diff_empty() -> None:
+    assert gitdiff.parse_diff("") == {}
+
+
+def test_parse_diff_quoted_paths() -> None:
+    diff = """\
+--- sp ace.py\t
++++ sp ace.py\t
+@@ -1 +1,2 @@
+-a
++b
++c
+--- "\\303\\251.py"
++++ "\\303\\251.py"
+@@ -4,0 +5 @@
++d
+--- "ta\\"b\\\\.py"
++++ "ta\\"b\\\\.py"
+@@ -7 +7 @@
+-e
++f
+"""
+    assert gitdiff.parse_diff(diff) == {
+        "sp ace.py": [(1, 2)],
+        "é.py": [(5, 5)],
+        'ta"b\\.py': [(7, 7)],
+    }
+
+
+def test_parse_diff_header_like_lines() -> None:
+    # Added "++ x" and removed "-- y" lines look like file headers
+    diff = """\
+--- b/x.py
++++ b/x.py
+@@ -2 +2,2 @@
+--- y
++++ x
+++++ z
+@@ -9,0 +11 @@
++done = 1
+\\ No newline at end of file
+"""
+    assert gitdiff.parse_diff(diff) == {"b/x.py": [(2, 3), (11, 11)]}
+
+
+@pytest.mark.parametrize(
+    ("path", "expect"),
+    [
+        ("b/plain.py", "b/plain.py"),
+        ("b/sp ace.py\t", "b/sp ace.py"),
+        ('"b/\\303\\251.py"', "b/é.py"),
+        ('"b/tab\\there.py"', "b/tab\there.py"),
+        ('"', '"'),
+    ],
+)
+def test_unquote_path(path: str, expect: str) -> None:
+    assert gitdiff.unquote_path(path) == expect
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+import pytest
+
+from idlealign import engine, lineindex
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+EQUALS = re.compile("=")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "a = 1",
+        "a = 1\n",
+        "a = 1\r\nbcd = 2\r\n\r\n",
+        "é = 😀\nx\r",
+    ],
+)
+def test_line_index(tmp_path: Path, text: str) -> None:
+    path = tmp_path / "file.txt"
+    path.write_bytes(text.encode("utf-8"))
+    expect = [line.removesuffix("\r") for line in text.split("\n")]
+    with lineindex.LineIndex(path) as lines:
+        assert len(lines) == len(expect)
+        assert list(lines) == expect
+        assert lines[1:] == expect[1:]
+        assert lines[-1] == expect[-1]
+        with pytest.raises(IndexError):
+            lines[len(expect)]
+
+
+@pytest.mark.parametrize(
+    ("text", "line_ranges"),
+    [
+        ("a = 1\nbcd = 2\n\nx=1\nyy = 2", None),
+        ("a = 1\r\nbcd = 2\r\n\r\nx=1\r\nyy = 2\r\n", None),
+        ("a = 1\nbcd = 2\n\nx=1\nyy = 2", [(3, 3)]),
+        ("a   = 1\nbcd = 2\n", None),
+    ],
+)
+def test_align_file(
+    tmp_path: Path,
+    text: str,
+    line_ranges: list[tuple[int, int]] | None,
+) -> None:
+    path = tmp_path / "file.txt"
+    path.write_bytes(text.encode("utf-8"))
+    expect = engine.align_text(text, EQUALS, line_ranges=line_ranges)
+    changed = expect is not None
+    check = lineindex.align_file(str(path), EQUALS, line_ranges=line_ranges)
+    assert check is changed
+    assert path.read_bytes() == text.encode("utf-8")
+    assert (
+        lineindex.align_file(
+            str(path),
+            EQUALS,
+            write=True,
+            line_ranges=line_ranges,
+        )
+        is changed
+    )
+    assert path.read_bytes().decode("utf-8") == (expect or text)
+    assert [file.name for file in tmp_path.iterdir()] == ["file.txt"]
+
+
+def test_align_file_not_utf8(tmp_path: Path) -> None:
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"a = \xff\nbcd = 2\n")
+    with pytest.raises(UnicodeDecodeError):
+        lineindex.align_file(str(path), EQUALS, write=True)
+    assert [file.name for file in tmp_path.iterdir()] == ["file.txt"]
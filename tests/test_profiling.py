@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import pstats
+import tracemalloc
+from typing import TYPE_CHECKING
+
+from idlealign.profiling import Profile
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_profile_writes_results(tmp_path: Path) -> None:
+    with Profile(tmp_path / "logs", "test") as profile:
+        sorted(range(1000), reverse=True)
+    assert profile.stats_path is not None
+    assert profile.snapshot_path is not None
+    assert profile.stats_path.name.startswith("test-")
+    assert (
+        pstats.Stats(str(profile.stats_path)).get_stats_profile().func_profiles
+    )
+    tracemalloc.Snapshot.load(str(profile.snapshot_path))
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_does_not_nest(tmp_path: Path) -> None:
+    with Profile(tmp_path, "outer") as outer:
+        with Profile(tmp_path, "inner") as inner:
+            pass
+        assert inner.stats_path is None
+    assert outer.stats_path is not None
+    assert len(list(tmp_path.glob("*.pstats"))) == 1
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import io
+import json
+from typing import Any
+
+import pytest
+
+from idlealign import server
+
+
+def call(
+    rpc: server.AlignServer,
+    method: str,
+    **params: Any,
+) -> dict[str, Any] | None:
+    return rpc.handle(
+        {"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
+    )
+
+
+def test_align_range() -> None:
+    rpc = server.AlignServer()
+    response = call(
+        rpc,
+        "align_range",
+        text="x\na = 1\nbbb = 2\nc = 3\n",
+        start=1,
+        end=2,
+        pattern="=",
+    )
+    assert response == {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "result": {
+            "changed": True,
+            "edits": [{"start": 1, "lines": ["a   = 1", "bbb = 2"]}],
+        },
+    }
+
+
+def test_align_range_line_breaks() -> None:
+    rpc = server.AlignServer()
+    # Only newlines end lines, with an optional carriage return before
+    response = call(
+        rpc,
+        "align_range",
+        text="a = 1\r\n\x0cbbb = 2\r\nc = 3\r\n",
+        pattern="=",
+    )
+    assert response is not None
+    assert response["result"]["edits"] == [
+        {"start": 0, "lines": ["a    = 1", "\x0cbbb = 2", "c    = 3", ""]},
+    ]
+
+
+def test_align_document_cached_by_uri() -> None:
+    rpc = server.AlignServer()
+    text = "a = 1\nbb = 2\n\nc = 3\n"
+    first = call(
+        rpc,
+        "align_document",
+        uri="file.py",
+        version=3,
+        text=text,
+        pattern="=",
+    )
+    second = call(rpc, "align_document", uri="file.py", version=3, pattern="=")
+    assert first == second
+    assert first is not None
+    assert first["result"]["edits"] == [
+        {"start": 0, "lines": ["a  = 1", "bb = 2"]},
+    ]
+    missing = call(
+        rpc,
+        "align_document",
+        uri="file.py",
+        version=4,
+        pattern="=",
+    )
+    assert missing is not None
+    assert missing["error"]["code"] == server.INVALID_PARAMS
+
+
+def test_detect_delimiter() -> None:
+    rpc = server.AlignServer()
+    response = call(rpc, "detect_delimiter", text="a: int\nb: str\n")
+    assert response is not None
+    assert response["result"] == {"delimiter": ":"}
+
+
+@pytest.mark.parametrize(
+    ("request_", "code"),
+    [
+        ([], server.INVALID_REQUEST),
+        ({"jsonrpc": "2.0", "id": 1}, server.INVALID_REQUEST),
+        (
+            {"jsonrpc": "2.0", "id": 1, "method": "nope"},
+            server.METHOD_NOT_FOUND,
+        ),
+        (
+            {"jsonrpc": "2.0", "id": 1, "method": "align_range", "params": []},
+            server.INVALID_PARAMS,
+        ),
+        (
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "align_range",
+                "params": {"text": "a", "pattern": "("},
+            },
+            server.INVALID_PARAMS,
+        ),
+        (
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "align_range",
+                "params": {"text": "a", "pattern": "=", "start": True},
+            },
+            server.INVALID_PARAMS,
+        ),
+    ],
+)
+def test_errors(request_: object, code: int) -> None:
+    response = server.AlignServer().handle(request_)
+    assert response is not None
+    assert response["error"]["code"] == code
+
+
+def test_notification_has_no_response() -> None:
+    rpc = server.AlignServer()
+    assert (
+        rpc.handle(
+            {
+                "jsonrpc": "2.0",
+                "method": "detect_delimiter",
+                "params": {"text": "a = 1"},
+            },
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        {"jsonrpc": "2.0", "method": "waffle"},
+        {"jsonrpc": "2.0", "method": "align_range", "params": []},
+        {"jsonrpc": "2.0", "method": "align_range", "params": {}},
+        {"jsonrpc": "1.0", "method": "detect_delimiter"},
+    ],
+)
+def test_failed_notification_has_no_response(request_: object) -> None:
+    assert server.AlignServer().handle(request_) is None
+
+
+def test_serve() -> None:
+    requests = [
+        {
+            "jsonrpc": "2.0",
+            "id": index,
+            "method": "align_range",
+            "params": {"text": "a = 1\nbb = 2", "pattern": "="},
+        }
+        for index in range(10)
+    ]
+    lines = [json.dumps(request) for request in requests]
+    lines.insert(3, "not json")
+    lines.append(
+        json.dumps({"jsonrpc": "2.0", "id": "end", "method": "shutdown"}),
+    )
+    lines.append(json.dumps(requests[0]))
+    output = io.StringIO()
+    server.AlignServer().serve(io.StringIO("\n".join(lines)), output)
+
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(responses) == 12
+    by_id = {response["id"]: response for response in responses}
+    assert by_id[None]["error"]["code"] == server.PARSE_ERROR
+    assert by_id["end"]["result"] is None
+    assert all(by_id[index]["result"]["changed"] for index in range(10))
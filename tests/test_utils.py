@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import json
 import sys
-from typing import Final
+from collections import deque
+from idlelib.delegator import Delegator
+from idlelib.undo import UndoDelegator
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Final, cast
 
 import pytest
 
-from idlealign import utils
+from idlealign import engine, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from idlelib.editor import EditorWindow
+    from pathlib import Path
 
 IS_WINDOWS: Final = sys.platform == "win32"
 
@@ -80,6 +90,82 @@ def test_get_whole_line(index: str, offset: int, expect: str) -> None:
     assert utils.get_whole_line(index, offset) == expect
 
 
+@pytest.mark.parametrize(
+    ("index", "line", "col"),
+    [("1.0", 1, 0), ("3.14", 3, 14), ("2981.23", 2981, 23)],
+)
+def test_text_position_parse(index: str, line: int, col: int) -> None:
+    position = utils.TextPosition.parse(index)
+    assert position == utils.TextPosition(line, col)
+    assert tuple(position) == (line, col)
+    assert str(position) == index
+    assert repr(position) == f"TextPosition({line}, {col})"
+
+
+def test_text_position_parse_failure() -> None:
+    with pytest.raises(ValueError, match="not enough values to unpack"):
+        utils.TextPosition.parse("27")
+
+
+def test_text_position_ordering() -> None:
+    positions = [
+        utils.TextPosition(3, 2),
+        utils.TextPosition(1, 9),
+        utils.TextPosition(3, 0),
+        utils.TextPosition(2),
+    ]
+    assert sorted(positions) == [
+        utils.TextPosition(1, 9),
+        utils.TextPosition(2, 0),
+        utils.TextPosition(3, 0),
+        utils.TextPosition(3, 2),
+    ]
+    assert utils.TextPosition(3, 2) >= utils.TextPosition(3, 0)
+    assert utils.TextPosition(1, 5) != (1, 5)
+    assert len({utils.TextPosition(4, 1), utils.TextPosition(4, 1)}) == 1
+    with pytest.raises(TypeError):
+        assert utils.TextPosition(1, 5) < (2, 0)
+
+
+@pytest.mark.parametrize(
+    ("position", "offset", "expect"),
+    [
+        (utils.TextPosition(3, 14), 0, utils.TextPosition(3, 0)),
+        (utils.TextPosition(3, 14), 1, utils.TextPosition(4, 0)),
+        (utils.TextPosition(2981, 23), -1, utils.TextPosition(2980, 0)),
+    ],
+)
+def test_text_position_line_start(
+    position: utils.TextPosition,
+    offset: int,
+    expect: utils.TextPosition,
+) -> None:
+    assert position.line_start(offset) == expect
+
+
+@pytest.mark.parametrize(
+    ("line", "length", "expect"),
+    [(1, 1, ("1.0", "2.0")), (7, 3, ("7.0", "10.0"))],
+)
+def test_get_line_span(
+    line: int,
+    length: int,
+    expect: tuple[str, str],
+) -> None:
+    start, end = utils.get_line_span(line, length)
+    assert (str(start), str(end)) == expect
+    assert utils.get_line_selection(line, length) == expect
+
+
+def test_fileposition_as_positions() -> None:
+    position = utils.FilePosition("waffle.py", 5, 2, 7, 9)
+    assert position.as_positions() == (
+        utils.TextPosition(5, 2),
+        utils.TextPosition(7, 9),
+    )
+    assert position.as_select() == ("5.2", "7.9")
+
+
 @pytest.mark.parametrize(
     ("text", "expect"),
     [("  waf", 2), ("cat", 0), ("     fish", 5), ("   ", 3), ("", 0)],
@@ -223,3 +309,352 @@ def test_fileposition_is_range() -> None:
         60,
         48,
     ).is_range()
+
+
+@pytest.mark.parametrize(
+    ("ranges", "expect"),
+    [
+        ([], []),
+        ([(5, 7), (1, 2)], [(1, 2), (5, 7)]),
+        ([(1, 3), (2, 6), (7, 8)], [(1, 8)]),
+        ([(1, 10), (3, 4)], [(1, 10)]),
+    ],
+)
+def test_merge_line_ranges(
+    ranges: list[tuple[int, int]],
+    expect: list[tuple[int, int]],
+) -> None:
+    assert utils.merge_line_ranges(ranges) == expect
+
+
+def test_extension_log(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(utils, "LOGS_PATH", tmp_path)
+    monkeypatch.setattr(utils, "TITLE", "test")
+    utils.extension_log("first\nsecond")
+    utils.extension_log("")
+    assert utils.flush_log()
+    lines = (tmp_path / "test.log").read_text(encoding="utf-8").splitlines()
+    assert [line[22:] for line in lines] == ["first", "second", ""]
+    assert all(line.startswith("[") for line in lines)
+
+
+def test_extension_log_rotates(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(utils, "LOGS_PATH", tmp_path)
+    monkeypatch.setattr(utils, "TITLE", "test")
+    monkeypatch.setattr(utils, "LOG_MAX_BYTES", 100)
+    monkeypatch.setattr(utils, "LOG_BACKUP_COUNT", 2)
+    for index in range(5):
+        utils.extension_log(f"{index}" * 60)
+        assert utils.flush_log()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "test.log",
+        "test.log.1",
+        "test.log.2",
+    ]
+    assert "4" * 60 in (tmp_path / "test.log").read_text(encoding="utf-8")
+    assert "2" * 60 in (tmp_path / "test.log.2").read_text(encoding="utf-8")
+
+
+def test_record_stats(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(utils, "STATS", deque(maxlen=2))
+
+    @utils.record_stats
+    def work(amount: int) -> int:
+        stats = utils.current_stats()
+        with stats.phase("work"):
+            stats.count("items", amount)
+        return amount
+
+    utils.set_stats_enabled(False)
+    assert work(1) == 1
+    assert not utils.STATS
+    assert isinstance(utils.current_stats(), utils.NullStats)
+
+    utils.set_stats_enabled(True)
+    try:
+        for amount in range(3):
+            assert work(amount) == amount
+    finally:
+        utils.set_stats_enabled(False)
+    assert [stats.counters for stats in utils.STATS] == [
+        {"items": 1},
+        {"items": 2},
+    ]
+    assert isinstance(utils.current_stats(), utils.NullStats)
+    dumped = json.loads(utils.dump_stats())
+    assert dumped[0]["name"].endswith("work")
+    assert set(dumped[0]["phases"]) == {"work"}
+    assert "Runs: 2" in utils.summarize_stats()
+
+
+class FakeText:
+    """Just enough of a text widget for undo commands."""
+
+    def __init__(self, text: str) -> None:
+        """Initialize with text."""
+        self.lines = text.split("\n")
+
+    def get_offset(self, index: str) -> tuple[int, int]:
+        """Return zero based (line, column) of index."""
+        line, column = utils.get_line_col(index)
+        return line - 1, column
+
+    def insert(self, index: str, chars: str, _tags: object = None) -> None:
+        """Insert chars at index."""
+        line, column = self.get_offset(index)
+        old = self.lines[line]
+        self.lines[line] = old[:column] + chars + old[column:]
+
+    def delete(self, start: str, end: str) -> None:
+        """Delete text from start to end on one line."""
+        line, column = self.get_offset(start)
+        end_line, end_column = self.get_offset(end)
+        assert line == end_line
+        old = self.lines[line]
+        self.lines[line] = old[:column] + old[end_column:]
+
+    def index(self, index: str) -> str:
+        """Return index, which is always already normalized."""
+        return index
+
+    def mark_names(self) -> tuple[str, ...]:
+        """Return no marks."""
+        return ()
+
+    def mark_set(self, _name: str, _index: str) -> None:
+        """Ignore marks."""
+
+    def see(self, _index: str) -> None:
+        """Ignore scrolling."""
+
+
+def test_line_edits_command_coalesces() -> None:
+    text = FakeText("a = 1\nbcd=2")
+    undo = UndoDelegator()
+    undo.delegate = text
+
+    def align(new_lines: list[str]) -> None:
+        edits = engine.get_line_edits(text.lines, new_lines, 1)
+        before = [text.lines[edit.line - 1] for edit in edits]
+        utils.add_line_edits(undo, edits, before, "region")
+
+    align(["a   = 1", "bcd = 2"])
+    align(["a    =  1", "bcd  =  2"])
+    assert text.lines == ["a    =  1", "bcd  =  2"]
+    assert len(undo.undolist) == 1
+    command = undo.undolist[0]
+    assert isinstance(command, utils.LineEditsCommand)
+    assert command.lines_before is None
+    # Only the changed parts are kept
+    assert command.edits == [
+        engine.LineEdit(1, 2, "=", "   = "),
+        engine.LineEdit(2, 3, "=", "  =  "),
+    ]
+
+    undo.undo_event(None)
+    assert text.lines == ["a = 1", "bcd=2"]
+    undo.redo_event(None)
+    assert text.lines == ["a    =  1", "bcd  =  2"]
+
+    # Edits without the lines before them are kept as separate records
+    utils.add_line_edits(undo, [engine.LineEdit(1, 0, "a", "A")], None)
+    utils.add_line_edits(undo, [engine.LineEdit(1, 0, "A", "a")], None)
+    assert len(undo.undolist) == 3
+
+
+def test_add_line_edits_records_phases(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(utils, "STATS", deque(maxlen=2))
+    text = FakeText("a = 1\nbcd=2")
+    undo = UndoDelegator()
+    undo.delegate = text
+
+    @utils.record_stats
+    def edit() -> None:
+        edits = [engine.LineEdit(2, 3, "=", " = ")]
+        utils.current_stats().count_chars(
+            "chars_to_tk",
+            (edit.new for edit in edits),
+        )
+        utils.add_line_edits(undo, edits, None)
+
+    utils.set_stats_enabled(True)
+    try:
+        edit()
+    finally:
+        utils.set_stats_enabled(False)
+    assert text.lines == ["a = 1", "bcd = 2"]
+    assert len(undo.undolist) == 1
+    (stats,) = utils.STATS
+    assert set(stats.phases) == {"edit", "undo"}
+    assert stats.counters == {"chars_to_tk": 3}
+
+
+def test_null_stats_count_chars_is_lazy() -> None:
+    strings = iter(["abc", "de"])
+    utils.NULL_STATS.count_chars("chars", strings)
+    assert next(strings) == "abc"
+
+
+class FakeEditorWindow:
+    """Editor window with only an undo delegator."""
+
+    def __init__(self, undo: UndoDelegator) -> None:
+        """Initialize with undo delegator."""
+        self.undo = undo
+
+
+def test_change_counter() -> None:
+    text = FakeText("a = 1\nbcd=2")
+    undo = UndoDelegator()
+    # Without binding undo events on fake text
+    Delegator.setdelegate(undo, text)
+    editwin = cast("EditorWindow", FakeEditorWindow(undo))
+    counter = utils.get_change_counter(editwin)
+    assert utils.get_change_counter(editwin) is counter
+    assert undo.delegate is counter
+    assert counter.delegate is text
+
+    changes: list[int] = []
+    counter.callbacks.append(lambda: changes.append(counter.count))
+
+    utils.add_line_edits(undo, [engine.LineEdit(2, 3, "=", " = ")], None)
+    assert text.lines == ["a = 1", "bcd = 2"]
+    assert counter.count == 2
+    undo.undo_event(None)
+    assert text.lines == ["a = 1", "bcd=2"]
+    assert counter.count == 4
+    assert changes == [1, 2, 3, 4]
+
+
+class FakeColorizer:
+    """Colorizer filter recording ranges it was notified of."""
+
+    def __init__(self, delegate: FakeText) -> None:
+        """Initialize on top of delegate."""
+        self.delegate = delegate
+        self.notified: list[tuple[str, str | None]] = []
+
+    def index(self, index: str) -> str:
+        """Return normalized index."""
+        return self.delegate.index(index)
+
+    def insert(self, index: str, chars: str, tags: object = None) -> None:
+        """Insert chars and notify."""
+        self.delegate.insert(index, chars, tags)
+        self.notify_range(index, f"{index}+{len(chars)}c")
+
+    def delete(self, start: str, end: str) -> None:
+        """Delete and notify."""
+        self.delegate.delete(start, end)
+        self.notify_range(start)
+
+    def notify_range(self, index1: str, index2: str | None = None) -> None:
+        """Record notified range."""
+        self.notified.append((index1, index2))
+
+
+def test_batch_colorizer() -> None:
+    color = FakeColorizer(FakeText("a\nb\nc\nd"))
+    editwin = SimpleNamespace(color=color)
+    with utils.batch_colorizer(editwin):  # type: ignore[arg-type]
+        color.insert("3.0", "x")
+        color.delete("3.0", "3.1")
+        color.insert("2.1", "y")
+    assert color.delegate.lines == ["a", "by", "c", "d"]
+    assert color.notified == [("2.0", "4.0")]
+    # Restored after block
+    color.insert("1.0", "z")
+    assert len(color.notified) == 2
+
+
+@pytest.mark.parametrize(
+    ("spans", "start", "expect"),
+    [
+        ([], 0, ""),
+        ([(3, 3)], 0, "  ^"),
+        ([(5, 7), (2, 3)], 0, " ^^ ^^^"),
+        ([(2, 6), (4, 9)], 0, " ^^^^^^^^"),
+        ([(2, 6)], 4, "^^"),
+        ([(1, 2)], 4, ""),
+        ([(6, 4)], 0, ""),
+    ],
+)
+def test_get_pointer_line(
+    spans: list[tuple[int, int]],
+    start: int,
+    expect: str,
+) -> None:
+    assert utils.get_pointer_line(spans, start) == expect
+
+
+def test_get_pointer_line_wide() -> None:
+    line = utils.get_pointer_line([(1, 100_000), (50, 200_000)])
+    assert line == "^" * 200_000
+
+
+class FakeVar:
+    """Tk variable stand in counting writes and calling traces."""
+
+    def __init__(self, value: str | bool) -> None:
+        """Initialize with value."""
+        self.value = value
+        self.writes = 0
+        self.traces: list[Callable[..., object]] = []
+
+    def get(self) -> str | bool:
+        """Return value."""
+        return self.value
+
+    def set(self, value: str | bool) -> None:
+        """Set value and call traces."""
+        self.value = value
+        self.writes += 1
+        for callback in self.traces:
+            callback("name", "", "write")
+
+    def trace_add(self, _mode: str, callback: Callable[..., object]) -> None:
+        """Add write trace."""
+        self.traces.append(callback)
+
+
+def test_search_engine_params() -> None:
+    engine = SimpleNamespace(
+        patvar=FakeVar("x"),
+        revar=FakeVar(False),
+        casevar=FakeVar(False),
+        wordvar=FakeVar(False),
+        wrapvar=FakeVar(True),
+        backvar=FakeVar(False),
+    )
+    mirror = utils.SearchEngineParams(engine)  # type: ignore[arg-type]
+    saved = mirror.get()
+    assert saved == {
+        "pat": "x",
+        "re": False,
+        "case": False,
+        "word": False,
+        "wrap": True,
+        "back": False,
+    }
+
+    mirror.set({"wrap": True, "back": True})
+    assert engine.wrapvar.writes == 0
+    assert engine.backvar.writes == 1
+    assert mirror.get()["back"] is True
+
+    # Changes made elsewhere are seen through the trace
+    engine.patvar.set("=")
+    assert mirror.get()["pat"] == "="
+
+    mirror.set(saved)
+    assert engine.patvar.value == "x"
+    assert engine.backvar.value is False
+    assert engine.casevar.writes == 0
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from idlealign import engine, watch
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+EQUALS = engine.compile_pattern("=")
+
+
+@pytest.mark.parametrize(
+    ("old", "new", "expect"),
+    [
+        ("abc", "abc", []),
+        ("abc", "abxc", [(2, 2)]),
+        ("abcd", "axyd", [(1, 2)]),
+        ("abcd", "abd", [(1, 2)]),
+        ("abc", "bc", [(0, 0)]),
+    ],
+)
+def test_get_dirty_ranges(
+    old: str,
+    new: str,
+    expect: list[tuple[int, int]],
+) -> None:
+    assert (
+        watch.get_dirty_ranges(watch.hash_lines(old), watch.hash_lines(new))
+        == expect
+    )
+
+
+def test_scan(tmp_path: Path) -> None:
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.py").write_text("a = 1\n", encoding="utf-8")
+    (tmp_path / "b.txt").write_text("b = 1\n", encoding="utf-8")
+    stats = watch.scan([str(tmp_path)])
+    assert list(stats) == [os.path.join(tmp_path, "sub", "a.py")]
+    assert stats[os.path.join(tmp_path, "sub", "a.py")].size == 6
+
+
+def test_poll_debounces(tmp_path: Path) -> None:
+    file = tmp_path / "a.py"
+    file.write_text("a = 1\n", encoding="utf-8")
+    watcher = watch.Watcher([str(tmp_path)], EQUALS, debounce=1)
+    assert watcher.poll(now=0) == []
+
+    file.write_text("a = 1\nbb = 2\n", encoding="utf-8")
+    assert watcher.poll(now=10) == []
+    assert watcher.poll(now=10.5) == []
+    file.write_text("a = 1\nbb = 2\nccc = 3\n", encoding="utf-8")
+    assert watcher.poll(now=10.9) == []
+    assert watcher.poll(now=11.5) == []
+    assert watcher.poll(now=12) == [str(file)]
+    assert watcher.poll(now=20) == []
+
+
+def test_align_file_only_dirty_blocks(tmp_path: Path) -> None:
+    file = tmp_path / "a.py"
+    file.write_text("a = 1\nbb = 2\n\nc = 3\ndd = 4\n", encoding="utf-8")
+    aligned: list[str] = []
+    watcher = watch.Watcher(
+        [str(tmp_path)],
+        EQUALS,
+        debounce=0,
+        on_aligned=aligned.append,
+    )
+    # Nothing changed since watching started
+    assert not watcher.align_file(str(file))
+
+    # Only the block touching the changed line is aligned, even on the
+    # first change after watching started
+    file.write_text("a = 1\nbb = 2\n\nc = 3\nddd = 4\n", encoding="utf-8")
+    assert watcher.align_file(str(file))
+    assert file.read_text(encoding="utf-8") == (
+        "a = 1\nbb = 2\n\nc   = 3\nddd = 4\n"
+    )
+    assert watcher.poll() == []
+    assert not watcher.align_file(str(file))
+    assert aligned == [str(file)]
+
+
+def test_align_file_new_file(tmp_path: Path) -> None:
+    watcher = watch.Watcher([str(tmp_path)], EQUALS, debounce=0)
+    file = tmp_path / "a.py"
+    file.write_text("a = 1\nbb = 2\n\nc = 3\ndd = 4\n", encoding="utf-8")
+    assert watcher.poll() == [str(file)]
+
+    # Created after watching started, so the whole file is aligned
+    assert watcher.align_file(str(file))
+    assert file.read_text(encoding="utf-8") == (
+        "a  = 1\nbb = 2\n\nc  = 3\ndd = 4\n"
+    )
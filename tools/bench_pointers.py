@@ -0,0 +1,63 @@
+"""Benchmark building caret pointer lines for very wide lines.
+
+Compares expanding every covered column into a set, as get_pointers
+used to, against get_pointer_line working on merged intervals.
+
+Run with `python tools/bench_pointers.py`.
+"""
+
+from __future__ import annotations
+
+import random
+import timeit
+
+from idlealign.utils import get_pointer_line
+
+
+def get_pointer_line_columns(spans: list[tuple[int, int]], start: int) -> str:
+    """Build pointer line one column at a time, like the old get_pointers."""
+    columns: set[int] = set()
+    for first, last in spans:
+        columns.update(range(first, last + 1))
+    new_line = ""
+    lastcol = start
+    for col in sorted(columns):
+        spaces = (col - lastcol) - 1
+        if spaces < 0:
+            continue
+        new_line += " " * spaces + "^"
+        lastcol = col
+    return new_line
+
+
+def main() -> None:
+    """Time both builders on lines thousands of columns wide."""
+    rng = random.Random(0)  # noqa: S311  # not for security
+    for width in (1_000, 10_000, 100_000):
+        spans = []
+        for _ in range(20):
+            first = rng.randrange(1, width)
+            spans.append(
+                (first, min(width, first + rng.randrange(width // 4))),
+            )
+        # Whole line diagnostic
+        spans.append((1, width))
+        assert get_pointer_line(spans, 4) == get_pointer_line_columns(spans, 4)
+        number = 20
+        columns = timeit.timeit(
+            lambda spans=spans: get_pointer_line_columns(spans, 4),
+            number=number,
+        )
+        intervals = timeit.timeit(
+            lambda spans=spans: get_pointer_line(spans, 4),
+            number=number,
+        )
+        print(
+            f"{width:>7} columns: "
+            f"per column {columns / number * 1000:8.3f} ms, "
+            f"intervals {intervals / number * 1000:8.3f} ms",
+        )
+
+
+if __name__ == "__main__":
+    main()